@@ -0,0 +1,43 @@
+""" benchmark: interpreter dispatch, in statements/sec
+
+    Runs a loop of 50k iterations, each executing the condition, three
+    assignments and the jump back, followed by 20k plain assignments.
+
+    Run: python bench_dispatch.py """
+
+import io
+import sys
+import time
+
+stdout = io.StringIO()  # helpers' print writes to __main__.stdout
+
+from pangshell import Interpreter, compile_lines
+
+ITERATIONS = 50_000
+ASSIGNMENTS = 20_000
+LINES = [
+    "i = 0",
+    "while $i < {}".format(ITERATIONS),
+    "    i += 1",
+    "    x = 1",
+    "    y = $x",
+    "end",
+] + ["z = 1"] * ASSIGNMENTS
+STATEMENTS = ITERATIONS * 5 + 2 + ASSIGNMENTS  # the last check, i = 0
+
+
+def run_once(code) -> float:
+    i = Interpreter()
+    i.script_cache.cache_dir = None
+
+    start = time.perf_counter()
+    i.run(code)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    code = compile_lines(LINES)
+    best = min(run_once(code) for _ in range(10))
+
+    sys.__stdout__.write("{:,} statements in {:.3f} s, {:,.0f} statements/s\n"
+                         .format(STATEMENTS, best, STATEMENTS / best))
@@ -0,0 +1,45 @@
+""" benchmark: FastLexer against the reference Lexer, in tokens/sec
+
+    Run: python bench_lexer.py """
+
+import sys
+import time
+
+stdout = sys.stdout  # helpers' print writes to __main__.stdout
+
+from pangshell import Lexer, FastLexer
+
+LINES = {
+    "typical": [
+        "x = 1",
+        "echo \"hello \" + $name",
+        "if $i < 10; echo $i; end",
+        "ls | type -n 3 > out.txt",
+        "total += $i * 2.5",
+    ],
+    "long tokens": [
+        "echo \"" + "a" * 2000 + "\" " + "b" * 2000 + " " + "1" * 2000,
+    ],
+}
+
+
+def tokens_per_sec(lexer: type, lines: list[str], seconds: float = 1.0) -> float:
+    tokens = 0
+    start = time.perf_counter()
+
+    while (elapsed := time.perf_counter() - start) < seconds:
+        for line in lines:
+            lexed = lexer(line)
+            lexed.lex()
+            tokens += len(lexed.toks)
+
+    return tokens / elapsed
+
+
+if __name__ == "__main__":
+    for name, lines in LINES.items():
+        slow = tokens_per_sec(Lexer, lines)
+        fast = tokens_per_sec(FastLexer, lines)
+
+        print("{:<12} Lexer {:>12,.0f}  FastLexer {:>12,.0f} tokens/s "
+              "({:.1f}x)".format(name, slow, fast, fast / slow))
@@ -0,0 +1,99 @@
+""" benchmark: slotted tokens and nodes against plain dataclasses
+
+    Parses the same 5000 lines with the slotted Token, Assign, Keyword
+    and Program classes, then with unslotted copies of them swapped
+    into pangshell, and prints the parse time and the memory held by
+    the tokens and nodes of every line. The old TokenType Enum is gone,
+    so the parse time it cost is not part of the comparison.
+
+    Run: python bench_nodes.py """
+
+import sys
+import time
+import tracemalloc
+from dataclasses import fields, make_dataclass, field, MISSING
+
+stdout = sys.stdout  # helpers' print writes to __main__.stdout
+
+import pangshell
+from pangshell import Parser, FastLexer
+
+CLASSES = ("Token", "Assign", "Keyword", "Program")
+LINES = [
+    "x = 1",
+    "total += $x * 2.5",
+    "echo \"hello \" + $name",
+    "ls -la /tmp",
+    "cd $dir",
+] * 1000
+
+
+def unslotted(cls: type) -> type:
+    """ The same dataclass without __slots__. """
+
+    spec = []
+
+    for f in fields(cls):
+        if f.default is not MISSING:
+            spec.append((f.name, f.type, field(default=f.default, init=f.init,
+                                               compare=f.compare)))
+        else:
+            spec.append((f.name, f.type))
+
+    namespace = {}
+
+    if hasattr(cls, "__post_init__"):
+        namespace["__post_init__"] = cls.__post_init__
+
+    return make_dataclass(cls.__name__, spec, namespace=namespace)
+
+
+def parse_all() -> list:
+    parsed = []
+
+    for line in LINES:
+        lexer = FastLexer(line)
+        p = Parser(lexer)
+        p.parse()
+        parsed.append((lexer.toks, p.ast))
+
+    return parsed
+
+
+def measure() -> tuple[float, int]:
+    """ Returns the best of five parse times and the traced bytes the
+        parsed lines hold. """
+
+    best = min(timed() for _ in range(5))
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    parsed = parse_all()
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del parsed
+
+    return best, held
+
+
+def timed() -> float:
+    start = time.perf_counter()
+    parse_all()
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    slotted_time, slotted_mem = measure()
+
+    for name in CLASSES:
+        setattr(pangshell, name, unslotted(getattr(pangshell, name)))
+
+    plain_time, plain_mem = measure()
+
+    print("{} lines".format(len(LINES)))
+    print("  dataclass  {:7.1f} ms  {:9,} bytes".format(
+        plain_time * 1e3, plain_mem))
+    print("  slotted    {:7.1f} ms  {:9,} bytes".format(
+        slotted_time * 1e3, slotted_mem))
+    print("  {:.2f}x faster, {:.0%} less memory".format(
+        plain_time / slotted_time, 1 - slotted_mem / plain_mem))
@@ -0,0 +1,68 @@
+""" benchmark: bytes written per keystroke by the line editor
+
+    Replays typing with LineRenderer and with the old redraw, which
+    erased and rewrote the whole input after every key, and prints the
+    bytes each writes for the last key and on average.
+
+    Run: python bench_render.py """
+
+import sys
+
+stdout = sys.stdout  # helpers' print writes to __main__.stdout
+
+from helpers import LineRenderer
+
+
+def old_redraw(inp_len: int, old_pos: int, inp: str, pos: int) -> str:
+    """ What Scanner.scan wrote for every key before LineRenderer. """
+
+    return (" " * (inp_len - old_pos) + "\b \b" * inp_len
+            + inp + "\b" * (len(inp) - pos))
+
+
+def typing(length: int, at_start: bool) -> list[tuple[str, int]]:
+    """ The line and cursor after each key when typing length characters,
+        appended, or inserted before an existing line of that length. """
+
+    keys = []
+    line = "x" * length if at_start else ""
+
+    for n in range(length):
+        pos = n if at_start else len(line)
+        line = line[:pos] + "a" + line[pos:]
+        keys.append((line, pos + 1))
+
+    return keys
+
+
+def bytes_per_key(keys: list[tuple[str, int]], start: str) -> tuple:
+    """ Returns the bytes the last key and an average key wrote, old and
+        new. """
+
+    renderer = LineRenderer()
+    renderer.render(start, 0)
+
+    old = []
+    new = []
+    prev, prev_pos = start, 0
+
+    for line, pos in keys:
+        old.append(len(old_redraw(len(prev), prev_pos, line, pos)))
+        new.append(len(renderer.render(line, pos)))
+        prev, prev_pos = line, pos
+
+    return old[-1], new[-1], sum(old) / len(old), sum(new) / len(new)
+
+
+if __name__ == "__main__":
+    print("{:<10} {:>6}  {:>9} {:>9}  {:>9} {:>9}".format(
+        "typing", "chars", "old last", "new last", "old avg", "new avg"))
+
+    for at_start, name in ((False, "appended"), (True, "inserted")):
+        for length in (10, 80, 500):
+            start = "x" * length if at_start else ""
+            old_last, new_last, old_avg, new_avg = bytes_per_key(
+                typing(length, at_start), start)
+
+            print("{:<10} {:>6}  {:>9} {:>9}  {:>9.1f} {:>9.1f}".format(
+                name, length, old_last, new_last, old_avg, new_avg))
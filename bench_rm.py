@@ -0,0 +1,68 @@
+""" benchmark: recursive_rm against the old recursive implementation
+
+    Builds a tree of files (200k by default) in a temporary directory,
+    deletes it with each implementation and prints the times. Output
+    is discarded, so the old per-file progress lines cost less than
+    they do on a terminal, and the worker pool only helps with more
+    than one CPU.
+
+    Run: python bench_rm.py [files] """
+
+import os
+import sys
+import time
+import tempfile
+
+stdout = open(os.devnull, "w")  # helpers' print writes to __main__.stdout
+
+from helpers import recursive_rm, print  # print as the old code did
+
+FILES_PER_DIR = 1000
+
+
+def old_recursive_rm(path: str) -> None:
+    """ recursive_rm before the rewrite, kept here for comparison. """
+
+    if not os.path.isdir(path):
+        raise NotADirectoryError("'{}' is not a directory.".format(path))
+
+    for entry in os.scandir(path):
+        joined_path = os.path.join(path, entry.name)
+
+        if entry.is_file():
+            print("Removing '{}'.".format(entry.name), end="\r")
+            os.remove(joined_path)
+            print(" " * len("Removing '{}'.".format(entry.name)), end="\r")
+        elif entry.is_dir():
+            old_recursive_rm(joined_path)
+
+    os.rmdir(path)
+
+
+def make_tree(root: str, files: int) -> None:
+    for n in range(files):
+        if n % FILES_PER_DIR == 0:
+            directory = os.path.join(root, "d{}".format(n // FILES_PER_DIR))
+            os.makedirs(directory)
+
+        with open(os.path.join(directory, "f{}".format(n)), "wb") as fp:
+            fp.write(b"x")
+
+
+def timed(rm, files: int) -> float:
+    root = tempfile.mkdtemp(prefix="bench-rm-")
+    make_tree(root, files)
+
+    start = time.perf_counter()
+    rm(root)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+
+    old = timed(old_recursive_rm, files)
+    new = timed(recursive_rm, files)
+
+    sys.__stdout__.write("{} files: old {:.2f} s, new {:.2f} s ({:.1f}x)\n"
+                         .format(files, old, new, old / new))
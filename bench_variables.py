@@ -0,0 +1,59 @@
+""" benchmark: per-statement cost as the number of variables grows
+
+    Before builtin.variables was built lazily, every statement rebuilt
+    it by joining the names of all variables. This times a loop of
+    statements with more and more variables defined, next to what that
+    join alone would cost per statement.
+
+    Run: python bench_variables.py """
+
+import sys
+import time
+
+stdout = sys.stdout  # helpers' print writes to __main__.stdout
+
+from pangshell import Interpreter, compile_lines
+
+ITERATIONS = 5000
+LOOP = [
+    "i = 0",
+    "while $i < {}".format(ITERATIONS),
+    "    i += 1",
+    "end",
+]
+STATEMENTS = 2 * ITERATIONS + 1  # the condition and the increment
+
+
+def per_statement(extra: int) -> tuple[float, float]:
+    """ Returns the seconds per statement now and what the old
+        listing join alone cost per statement. """
+
+    i = Interpreter()
+
+    for n in range(extra):
+        i.variables["bench.v{}".format(n)] = n
+
+    code = compile_lines(LOOP)
+
+    start = time.perf_counter()
+    i.run(code)
+    now = (time.perf_counter() - start) / STATEMENTS
+
+    start = time.perf_counter()
+
+    for _ in range(1000):
+        ",\n".join(i.variables) + "\n"
+
+    old = (time.perf_counter() - start) / 1000
+
+    return now, old
+
+
+if __name__ == "__main__":
+    print("{:>9}  {:>14}  {:>18}".format(
+        "variables", "us/statement", "old join/statement"))
+
+    for extra in (0, 1000, 3000, 10000):
+        now, old = per_statement(extra)
+        print("{:>9}  {:>14.2f}  {:>18.2f}".format(
+            extra, now * 1e6, old * 1e6))
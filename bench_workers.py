@@ -0,0 +1,64 @@
+""" benchmark: a resident script in a warm worker against a fresh
+    interpreter per run
+
+    Runs a trivial script that imports json and decimal 50 times each
+    way and prints the average latency of a run.
+
+    Run: python bench_workers.py """
+
+import io
+import os
+import sys
+import time
+import tempfile
+import subprocess
+
+from workers import WorkerPool
+
+RUNS = 50
+SCRIPT = """import sys, json, decimal
+print("tool", sys.argv[1:])
+"""
+
+
+def warm(script: str) -> float:
+    pool = WorkerPool()
+    pool.start()
+    out = io.StringIO()
+
+    try:
+        pool.run(script, [script], out, out)  # the imports, paid once
+
+        start = time.perf_counter()
+
+        for _ in range(RUNS):
+            pool.run(script, [script], out, out)
+
+        return (time.perf_counter() - start) / RUNS
+    finally:
+        pool.close()
+
+
+def cold(script: str) -> float:
+    start = time.perf_counter()
+
+    for _ in range(RUNS):
+        subprocess.run([sys.executable, script], stdout=subprocess.DEVNULL)
+
+    return (time.perf_counter() - start) / RUNS
+
+
+if __name__ == "__main__":
+    fd, script = tempfile.mkstemp(prefix="bench-tool-", suffix=".py")
+
+    try:
+        with os.fdopen(fd, "w") as fp:
+            fp.write(SCRIPT)
+
+        warm_time = warm(script)
+        cold_time = cold(script)
+    finally:
+        os.remove(script)
+
+    print("warm {:.2f} ms, cold {:.2f} ms per run ({:.0f}x)".format(
+        warm_time * 1e3, cold_time * 1e3, cold_time / warm_time))
@@ -0,0 +1,132 @@
+""" command resolution cache, similar to 'hash' in POSIX shells """
+
+import os
+
+WINDOWS = os.name == "nt"
+
+# extensions tried after the name, in order (.ps scripts always come first)
+EXTENSIONS = ("", ".bat", ".exe", ".cmd", ".com") if WINDOWS else ("",)
+
+
+class CommandCache:
+    """ Resolves command names to files.
+
+        Every searched directory is indexed once with a single scandir and
+        re-indexed only when its mtime changes. Resolved commands are
+        remembered (hashed) until the file disappears or the cache is cleared. """
+
+    def __init__(self) -> None:
+        # directory -> (mtime_ns, normcased name -> real name)
+        self.indexes: dict[str, tuple[int, dict[str, str]]] = {}
+        # command name -> [path, hits]
+        self.hashed: dict[str, list] = {}
+
+    def search_dirs(self) -> list[str]:
+        """ Directories searched for commands, in order of priority. """
+
+        dirs = []
+
+        if WINDOWS and os.environ.get("WINDIR"):
+            dirs.append(os.environ["WINDIR"])
+
+        for path in os.environ.get("PATH", "").split(os.pathsep):
+            if path and path not in dirs:
+                dirs.append(path)
+
+        return dirs
+
+    def index(self, path: str) -> dict[str, str]:
+        """ Returns the names of the files in path, re-scanning it
+            only when its mtime changed. """
+
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            self.indexes.pop(path, None)
+            return {}
+
+        cached = self.indexes.get(path)
+
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        names = {}
+
+        try:
+            for entry in os.scandir(path):
+                try:
+                    if entry.is_file():
+                        names[os.path.normcase(entry.name)] = entry.name
+                except OSError:
+                    pass  # broken link or entry removed while scanning
+        except OSError:
+            return {}
+
+        self.indexes[path] = (mtime, names)
+        return names
+
+    @staticmethod
+    def _candidates(name: str, extensions: tuple[str, ...]) -> list[str]:
+        return [os.path.normcase(name + ext) for ext in extensions]
+
+    @staticmethod
+    def _is_runnable(path: str) -> bool:
+        return path.endswith(".ps") or WINDOWS or os.access(path, os.X_OK)
+
+    def _find_in(self, path: str, candidates: list[str]) -> str | None:
+        names = self.index(path)
+
+        for candidate in candidates:
+            if candidate in names:
+                found = os.path.join(path, names[candidate])
+
+                if self._is_runnable(found):
+                    return found
+
+        return None
+
+    def resolve(self, name: str) -> str | None:
+        """ Returns the file a command name refers to, or None. """
+
+        if not name:
+            return None
+
+        # explicit paths are never hashed
+        if os.sep in name or "/" in name:
+            for ext in (".ps",) + EXTENSIONS:
+                if os.path.isfile(name + ext) and self._is_runnable(name + ext):
+                    return os.path.abspath(name + ext)
+
+            return None
+
+        # scripts (and on Windows programs) in the current directory
+        # take priority, they are indexed but not hashed as cwd changes
+        found = self._find_in(os.getcwd(), self._candidates(
+            name, (".ps",) + EXTENSIONS if WINDOWS else (".ps",)))
+
+        if found is not None:
+            return found
+
+        hashed = self.hashed.get(name)
+
+        if hashed is not None:
+            if os.path.isfile(hashed[0]):
+                hashed[1] += 1
+                return hashed[0]
+
+            del self.hashed[name]
+
+        candidates = self._candidates(name, (".ps",) + EXTENSIONS)
+
+        for path in self.search_dirs():
+            found = self._find_in(path, candidates)
+
+            if found is not None:
+                self.hashed[name] = [found, 1]
+                return found
+
+        return None
+
+    def clear(self) -> None:
+        self.indexes.clear()
+        self.hashed.clear()
@@ -0,0 +1,237 @@
+""" tab completion """
+
+import os
+from typing import Any, Callable, Iterable
+
+from commands import CommandCache, EXTENSIONS
+
+COMPLETION_LIMIT = 100  # candidates cycled through per tab
+BURST_SIZE = 32  # words a trie node holds before splitting by character
+
+
+class TrieNode:
+    __slots__ = ("children", "bucket", "end")
+
+    def __init__(self) -> None:
+        self.children: dict[str, "TrieNode"] | None = None
+        self.bucket: list[str] | None = []
+        self.end = False
+
+
+class Trie:
+    """ Prefix tree of words.
+
+        Nodes start as small buckets of whole words and only split into
+        per-character children once they hold more than BURST_SIZE words,
+        which keeps tens of thousands of candidates cheap in memory. """
+
+    def __init__(self, words: Iterable[str] = ()) -> None:
+        self.root = TrieNode()
+        self.size = 0
+
+        for word in words:
+            self.insert(word)
+
+    @staticmethod
+    def _burst(node: TrieNode, depth: int) -> None:
+        node.children = {}
+
+        for word in node.bucket:
+            if len(word) == depth:
+                node.end = True
+                continue
+
+            child = node.children.get(word[depth])
+
+            if child is None:
+                child = node.children[word[depth]] = TrieNode()
+
+            child.bucket.append(word)
+
+        node.bucket = None
+
+        for child in node.children.values():
+            if len(child.bucket) > BURST_SIZE:
+                Trie._burst(child, depth + 1)
+
+    def insert(self, word: str) -> None:
+        node = self.root
+        depth = 0
+
+        while node.bucket is None:
+            if depth == len(word):
+                self.size += not node.end
+                node.end = True
+                return
+
+            child = node.children.get(word[depth])
+
+            if child is None:
+                child = node.children[word[depth]] = TrieNode()
+
+            node = child
+            depth += 1
+
+        if word in node.bucket:
+            return
+
+        node.bucket.append(word)
+        self.size += 1
+
+        if len(node.bucket) > BURST_SIZE:
+            self._burst(node, depth)
+
+    def complete(self, prefix: str,
+                 limit: int = COMPLETION_LIMIT) -> list[str]:
+        """ Returns up to limit words starting with prefix, sorted. """
+
+        node = self.root
+        depth = 0
+
+        while depth < len(prefix):
+            if node.bucket is not None:
+                return sorted(word for word in node.bucket
+                              if word.startswith(prefix))[:limit]
+
+            node = node.children.get(prefix[depth])
+
+            if node is None:
+                return []
+
+            depth += 1
+
+        res = []
+        stack = [(prefix, node)]
+
+        while stack and len(res) < limit:
+            word, node = stack.pop()
+
+            if node.bucket is not None:
+                res.extend(sorted(node.bucket)[:limit - len(res)])
+                continue
+
+            if node.end:
+                res.append(word)
+
+            # push in reverse so the smallest child is visited first
+            for ch in sorted(node.children, reverse=True):
+                stack.append((word + ch, node.children[ch]))
+
+        return res
+
+
+class Completer:
+    """ Completes the word before the cursor.
+
+        Commands are completed from keywords, PATH executables and
+        the current directory, $names from the interpreter's variables
+        (including dotted setting names) and anything else as a path.
+        Every source is built lazily and rebuilt only once it changed. """
+
+    def __init__(self, keywords: list[str],
+                 variables: Callable[[], Any] | None = None,
+                 commands: CommandCache | None = None) -> None:
+        self.keywords = Trie(keywords)
+        self.variables = variables
+        self.commands = commands
+
+        self._variables = (None, None, Trie())  # mapping, version, trie
+        self._executables = (None, Trie())      # directory mtimes, trie
+        self._dirs: dict[str, tuple[int, Trie]] = {}
+
+    def variable_trie(self) -> Trie:
+        variables = self.variables()
+        version = getattr(variables, "version", None)
+        cached, cached_version, trie = self._variables
+
+        if cached is not variables or version is None \
+                or version != cached_version:
+            trie = Trie(variables)
+            self._variables = (variables, version, trie)
+
+        return trie
+
+    def executable_trie(self) -> Trie:
+        dirs = self.commands.search_dirs()
+        names = [self.commands.index(path) for path in dirs]
+        # index() re-scans a directory only when its mtime changed
+        signature = tuple(self.commands.indexes.get(path, (None,))[0]
+                          for path in dirs)
+
+        if signature == self._executables[0]:
+            return self._executables[1]
+
+        trie = Trie()
+
+        for index in names:
+            for name in index.values():
+                trie.insert(name)
+                stem, ext = os.path.splitext(name)
+
+                if ext == ".ps" or (ext and ext.lower() in EXTENSIONS):
+                    trie.insert(stem)
+
+        self._executables = (signature, trie)
+        return trie
+
+    def dir_trie(self, path: str) -> Trie:
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return Trie()
+
+        cached = self._dirs.get(path)
+
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        trie = Trie()
+
+        try:
+            for entry in os.scandir(path):
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+
+                trie.insert(entry.name + "/" if is_dir else entry.name)
+        except OSError:
+            pass
+
+        self._dirs[path] = (mtime, trie)
+        return trie
+
+    def complete_path(self, word: str) -> list[str]:
+        cut = max(word.rfind("/"), word.rfind(os.sep)) + 1
+        head, tail = word[:cut], word[cut:]
+
+        return [head + name for name in
+                self.dir_trie(os.path.abspath(head or "."))
+                .complete(tail)]
+
+    def complete(self, line: str, pos: int) -> tuple[int, list[str]]:
+        """ Returns where the word before pos starts and its completions. """
+
+        start = line.rfind(" ", 0, pos) + 1
+        word = line[start:pos]
+
+        if word.startswith("$") and self.variables is not None:
+            return start, ["$" + name for name in
+                           self.variable_trie().complete(word[1:])]
+
+        if line[:start].strip():
+            return start, self.complete_path(word)
+
+        # command position
+        candidates = self.keywords.complete(word)
+
+        if not word:
+            return start, candidates
+
+        if self.commands is not None:
+            candidates += self.executable_trie().complete(word)
+
+        candidates += self.complete_path(word)
+
+        # keep order, drop duplicates (a keyword can also be a file)
+        return start, list(dict.fromkeys(candidates))[:COMPLETION_LIMIT]
@@ -1,9 +1,19 @@
 import __main__
-from platform import uname, system
-
-if system() == "Windows":
+from sys import platform
+from socket import gethostname
+from collections import deque
+from itertools import islice
+from threading import Lock
+from time import monotonic
+from typing import Any, Iterator
+from history import History
+from completion import Completer
+from stat import S_ISDIR, S_ISREG
+from codecs import getincrementaldecoder
+
+if platform == "win32":
     from pangsh_win import *
-elif system() == "Linux":
+elif platform.startswith("linux"):
     from pangsh_unix import *
 else:
     print("Your OS is not supported by pangshell.")
@@ -31,6 +41,13 @@ keywords = [
     "del",  "title",
     "cls",  "uptime",
     "set",  "neofetch",
+    "hash", "jobs",
+    "wait", "fg",
+    "if",   "else",
+    "for",  "while",
+    "func", "return",
+    "break", "continue",
+    "parallel", "resident",
 
     "@echo",
 ]
@@ -67,6 +84,38 @@ def gradient(strings: list, start: tuple, end: tuple) -> list:
     return res
 
 
+# neofetch's uptime changes every run, it is filled into the cached banner
+UPTIME_MARK = "\0uptime\0"
+SECONDS_MARK = "\0seconds\0"
+
+
+def render_banner(logo_path: str, version: Any) -> str:
+    """ Returns the logo with the system info next to it, the uptime
+        left as UPTIME_MARK and SECONDS_MARK. """
+
+    from platform import uname  # slow to import, only needed here
+
+    info = uname()
+
+    with open(logo_path, "r") as fp:
+        logo = fp.read().split("\n")
+
+    buf = [
+        "OS: {} {} {}".format(info.system, info.release, info.version),
+        "Host: {}".format(gethostname()),
+        "Uptime: " + UPTIME_MARK,
+        "and " + SECONDS_MARK,
+        "Resolution: {}".format(get_screen_res()),
+        "Shell: PangShell v{}".format(version),
+    ]
+
+    for ind, line in enumerate(buf[:len(logo)]):
+        logo[ind] += line
+
+    return "\n" + "\n".join(
+        gradient(logo, (230, 45, 65), (55, 125, 235))) + "\n"
+
+
 months = {
     1: "Jan",  2: "Feb",
     3: "Mar",  4: "Apr",
@@ -96,21 +145,106 @@ def format_size(size: int) -> str:
     return "{} {}".format(round(size / 1000**exponent, 2), name)
 
 
-def recursive_rm(path: str) -> None:
+RM_BATCH = 256            # files unlinked per task
+RM_PROGRESS_INTERVAL = 0.1  # seconds between progress updates
+
+
+class RmProgress:
+    """ Totals shared between the rm workers and the progress line. """
+
+    def __init__(self) -> None:
+        self.lock = Lock()
+        self.files = 0
+        self.bytes = 0
+        self.last_report = 0.0
+        self.width = 0
+
+    def add(self, files: int, size: int) -> None:
+        with self.lock:
+            self.files += files
+            self.bytes += size
+
+    def report(self, force: bool = False) -> None:
+        now = monotonic()
+
+        if not force and now - self.last_report < RM_PROGRESS_INTERVAL:
+            return
+
+        self.last_report = now
+        line = "Removing... {} files ({})".format(
+            self.files, format_size(self.bytes))
+        print(line.ljust(self.width), end="\r")
+        self.width = len(line)
+
+    def clear(self) -> None:
+        print(" " * self.width, end="\r")
+
+
+def rm_batch(progress: RmProgress, batch: list[tuple[str, int]]) -> None:
+    for path, size in batch:
+        os.remove(path)
+
+    progress.add(len(batch), sum(size for _, size in batch))
+
+
+def recursive_rm(path: str, workers: int | None = None) -> None:
+    """ Removes path and everything below it.
+
+        The tree is walked iteratively, files are unlinked in batches on a
+        pool of workers and directories are removed bottom-up at the end. """
+
+    from concurrent.futures import ThreadPoolExecutor, wait  # slow import
+
+    if os.path.islink(path):
+        os.remove(path)  # the link itself, never what it points to
+        print("Removed the link {}.".format(path))
+        return
+
     if not os.path.isdir(path):
         raise NotADirectoryError("'{}' is not a directory.".format(path))
 
-    for entry in os.scandir(path):
-        joined_path = os.path.join(path, entry.name)
+    progress = RmProgress()
+    stack = [path]
+    dirs = []
+    futures = []
+    batch = []
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        while stack:
+            cur = stack.pop()
+            dirs.append(cur)  # parents always come before their children
+
+            with os.scandir(cur) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                        continue
+
+                    # links are removed, never followed
+                    batch.append((entry.path,
+                                  entry.stat(follow_symlinks=False).st_size))
 
-        if entry.is_file():
-            print("Removing '{}'.".format(entry.name), end="\r")
-            os.remove(joined_path)
-            print(" " * len("Removing '{}'.".format(entry.name)), end="\r")
-        elif entry.is_dir():
-            recursive_rm(joined_path)
+                    if len(batch) >= RM_BATCH:
+                        futures.append(pool.submit(rm_batch, progress, batch))
+                        batch = []
 
-    os.rmdir(path)
+            progress.report()
+
+        if batch:
+            futures.append(pool.submit(rm_batch, progress, batch))
+
+        while wait(futures, RM_PROGRESS_INTERVAL).not_done:
+            progress.report()
+
+    for future in futures:
+        future.result()  # re-raise the first failed unlink, if any
+
+    for cur in reversed(dirs):
+        os.rmdir(cur)
+
+    progress.clear()
+    print("Removed {} files ({}) and {} directories.".format(
+        progress.files, format_size(progress.bytes), len(dirs)))
 
 
 def normal_rm(path: str) -> None:
@@ -121,10 +255,6 @@ def normal_rm(path: str) -> None:
     os.remove(path)
 
 
-def clear_out(inp_len: int, old_pos: int) -> str:
-    return " " * (inp_len - old_pos) + "\b \b" * (inp_len)
-
-
 def remove_word(s: str, pos: int) -> str:
     index = s.rfind(" ", 0, pos)
 
@@ -133,72 +263,248 @@ def remove_word(s: str, pos: int) -> str:
     return s[:index] + s[pos:]
 
 
-_ls_buf = ""
-_ls_files = _ls_dirs = 0
+LS_CHUNK = 512  # entries formatted per task
+
+
+def ls_format(extension: str, entries: list) -> tuple[str, int, int]:
+    """ Formats a chunk of directory entries.
 
+        Returns the formatted text and the amount of files and directories. """
 
-def ls_thread(extension: str, iterator) -> None:
-    global _ls_buf, _ls_files, _ls_dirs
+    buf = []
+    files = dirs = 0
 
-    for entry in iterator:
+    for entry in entries:
         if not entry.name.endswith(extension):
             continue
 
-        formatted_date = format_date(entry.stat().st_mtime)
+        try:
+            st = entry.stat()  # the only stat for this entry
+        except OSError:
+            continue  # broken link or entry removed while listing
+
+        formatted_date = format_date(st.st_mtime)
+
+        if S_ISREG(st.st_mode):
+            buf.append(rgb(formatted_date, GREEN)
+                       + " File: "
+                       + rgb("{:>9} ".format(format_size(st.st_size)), RED)
+                       + rgb(entry.name, BLUE) + "\n")
+            files += 1
+        elif S_ISDIR(st.st_mode):
+            buf.append(rgb(formatted_date, GREEN)
+                       + " Dir:            "
+                       + rgb(entry.name, BLUE) + "\n")
+            dirs += 1
+
+    return "".join(buf), files, dirs
+
+
+def ls_stream(extension: str, path: str | None = None,
+              workers: int | None = None) -> Iterator[str]:
+    """ Lists path using a pool of workers, yielding formatted text as
+        it is produced and the Files/Directories summary last.
+
+        Entries are read from scandir in chunks, at most 2 * workers chunks
+        are in flight, and results are yielded in scandir order, so memory
+        stays bounded regardless of the directory size. """
+
+    from concurrent.futures import ThreadPoolExecutor  # slow import
+
+    workers = workers or os.cpu_count() or 1
+    pending = deque()
+    ls_files = ls_dirs = 0
+
+    with os.scandir(path) as it, \
+            ThreadPoolExecutor(max_workers=workers) as pool:
+        for chunk in iter(lambda: list(islice(it, LS_CHUNK)), []):
+            pending.append(pool.submit(ls_format, extension, chunk))
+
+            if len(pending) < 2 * workers:
+                continue
+
+            text, files, dirs = pending.popleft().result()
+            ls_files += files
+            ls_dirs += dirs
+            yield text
+
+        while pending:
+            text, files, dirs = pending.popleft().result()
+            ls_files += files
+            ls_dirs += dirs
+            yield text
+
+    yield "\n - Files: {}\n - Directories: {}\n".format(ls_files, ls_dirs)
+
+
+def threaded_ls(extension: str, path: str | None = None,
+                workers: int | None = None) -> str:
+    return "".join(ls_stream(extension, path, workers))
+
+
+TYPE_CHUNK = 1 << 16  # bytes read at a time by type
+
+
+def tail_offset(fp, lines: int) -> int:
+    """ Returns where the last lines of fp start, reading backwards
+        from the end in chunks instead of scanning the whole file. """
+
+    end = pos = fp.seek(0, os.SEEK_END)
+
+    if lines <= 0:
+        return end
+
+    count = 0
+
+    while pos > 0:
+        size = min(TYPE_CHUNK, pos)
+        pos -= size
+        fp.seek(pos)
+        chunk = fp.read(size)
+
+        if pos + size == end and chunk.endswith(b"\n"):
+            chunk = chunk[:-1]  # the final newline ends the last line
 
-        if entry.is_file():
-            _ls_buf += rgb(formatted_date, GREEN) \
-                + " File: " \
-                + rgb("{:>9} ".format(format_size(entry.stat().st_size)), RED) \
-                + rgb(entry.name, BLUE) + "\n"
-            _ls_files += 1
-        elif entry.is_dir():
-            _ls_buf += rgb(formatted_date, GREEN) \
-                + " Dir:            " \
-                + rgb(entry.name, BLUE) + "\n"
-            _ls_dirs += 1
+        found = len(chunk)
 
+        while (found := chunk.rfind(b"\n", 0, found)) != -1:
+            count += 1
 
-def threaded_ls(extension: str, path: str | None = None) -> str:
-    global _ls_buf, _ls_files, _ls_dirs
+            if count == lines:
+                return pos + found + 1
 
-    dir_list = list(os.scandir(path))
-    entries = len(dir_list)
-    dir_list_left = dir_list[:entries >> 1]
-    dir_list_right = dir_list[entries >> 1:]
-    del dir_list
+    return 0
 
-    t1 = Thread(target=ls_thread, args=(extension, dir_list_left))
-    t2 = Thread(target=ls_thread, args=(extension, dir_list_right))
-    del dir_list_left, dir_list_right
 
-    t1.start()
-    t2.start()
+def type_stream(path: str, lines: int | None = None,
+                tail: bool = False) -> Iterator[str]:
+    """ Yields the text of path in chunks, decoded incrementally so a
+        character split between chunks is kept whole and bytes that are
+        not utf-8 are replaced instead of failing.
 
-    t1.join()
-    t2.join()
+        If lines is given only the first (or with tail, the last)
+        lines are yielded. """
 
-    ls_buf = _ls_buf
-    ls_files = _ls_files
-    ls_dirs = _ls_dirs
+    decoder = getincrementaldecoder("utf-8")("replace")
 
-    _ls_buf = ""
-    _ls_files = _ls_dirs = 0
-    return ls_buf + "\n - Files: {}\n - Directories: {}\n".format(ls_files, ls_dirs)
+    with open(path, "rb") as fp:
+        if lines is not None and tail:
+            fp.seek(tail_offset(fp, lines))
+            lines = None
+
+        while chunk := fp.read(TYPE_CHUNK):
+            if lines is not None:
+                pos = 0
+
+                while lines:
+                    found = chunk.find(b"\n", pos)
+
+                    if found == -1:
+                        break
+
+                    pos = found + 1
+                    lines -= 1
+
+                if not lines:
+                    yield decoder.decode(chunk[:pos], True)
+                    return
+
+            yield decoder.decode(chunk)
+
+    yield decoder.decode(b"", True)
+
+
+_prompt_width = 0
+
+
+def prompt(continuation: bool = False) -> str:
+    """ Returns the prompt and refreshes the cached console geometry,
+        so nothing has to be queried again while the user types.
+
+        The continuation prompt, shown while a block is still open,
+        lines up with the normal one. """
+
+    global _prompt_width
+
+    refresh_console_size()
+    cwd = gcwd()
+    _prompt_width = len(cwd) + 4
+
+    if continuation:
+        return " " * len(cwd) + rgb("> ", GREEN)
+
+    return rgb(cwd, PURPLE) + rgb("$ ", GREEN)
 
 
 def input_width() -> int:
     """ Returns the amount of characters the user can input. """
-    return get_console_width() - (len(gcwd()) + 4)
+    return get_console_width() - _prompt_width
 
 
-class Scanner:
+class LineRenderer:
+    """ Keeps a model of the input line on screen and returns only the
+        output needed to turn it into a new line and cursor position. """
+
     def __init__(self) -> None:
+        self.shown = ""
+        self.pos = 0
+
+    def reset(self) -> None:
+        self.shown = ""
+        self.pos = 0
+
+    def render(self, line: str, pos: int) -> str:
+        shown = self.shown
+        out = []
+        cur = self.pos
+
+        def move(to: int) -> None:
+            nonlocal cur
+
+            if to < cur:
+                out.append("\b" * (cur - to))
+            elif to > cur:
+                out.append(line[cur:to])  # rewriting chars moves right
+
+            cur = to
+
+        if line != shown:
+            common = 0
+            limit = min(len(line), len(shown))
+
+            while common < limit and line[common] == shown[common]:
+                common += 1
+
+            move(common)
+            out.append(line[common:])
+            cur = len(line)
+
+            if len(shown) > len(line):  # erase what is left of the old line
+                extra = len(shown) - len(line)
+                out.append(" " * extra + "\b" * extra)
+
+        move(pos)
+
+        self.shown = line
+        self.pos = pos
+
+        return "".join(out)
+
+
+class Scanner:
+    def __init__(self, history: History | None = None,
+                 completer: Completer | None = None) -> None:
+        self.renderer = LineRenderer()
+        self.completer = completer if completer is not None \
+            else Completer(keywords)
+        self.completions = []
+        self.completion_start = 0
+        self.tail = ""
         self.autofill_cycle = False
         self.autofill_count = 0
         self.pos = 0
-        self.prev_input = []
-        self.prev_count = 0
+        self.prev_input = history if history is not None else History()
+        self.prev_count = len(self.prev_input)
         self.inp = ""
 
     def getch(self) -> int:
@@ -211,30 +517,25 @@ class Scanner:
         return res
 
     def auto_fill(self) -> None:
-        self.pos += 1
-        self.autofill_count += 1
-
-        if self.inp.rstrip().find(" ") != -1:
-            return
-
-        if not self.inp:
-            self.autofill_cycle = True
-            self.inp = keywords[0]
-            return
+        """ Completes the word before the cursor, repeated tabs cycle
+            through the other candidates. """
+
+        if not self.autofill_cycle:
+            self.completion_start, self.completions = \
+                self.completer.complete(self.inp, self.pos)
+            self.autofill_count = 0
+            self.autofill_cycle = bool(self.completions)
+            self.tail = self.inp[self.pos:]
+        else:
+            self.autofill_count += 1
 
-        if self.autofill_cycle:
-            self.inp = keywords[
-                self.autofill_count % len(keywords)]
+        if not self.completions:
             return
 
-        self.autofill_cycle = False
-
-        valid_kws = [kw for kw in keywords
-                     if kw.startswith(self.inp[0]) and kw != self.inp]
+        word = self.completions[self.autofill_count % len(self.completions)]
 
-        if valid_kws:
-            self.inp = valid_kws[
-                self.autofill_count % len(valid_kws)]
+        self.inp = self.inp[:self.completion_start] + word + self.tail
+        self.pos = self.completion_start + len(word)
 
     def backspace(self) -> None:
         if self.pos <= 0:
@@ -249,17 +550,13 @@ class Scanner:
         self.inp = self.inp[:self.pos] + self.inp[self.pos+1:]
 
     def move_cursor(self, n: int) -> None:
-        self.pos += n
-        move_cursor(n, 0)
-    
-    def autofill_prev(self, n: int) -> None:
-        clear = clear_out(len(self.inp), self.pos)
+        self.pos += n  # drawn by the renderer with the rest of the line
 
+    def autofill_prev(self, n: int) -> None:
         self.prev_count += n
         
         self.inp = self.prev_input[self.prev_count]
         self.pos = len(self.inp)
-        stdout.write(clear + self.inp)
     
     def move_cursor_word(self, right: bool) -> None:
         if right:
@@ -293,6 +590,54 @@ class Scanner:
         elif ch == 116:                                                           # CTRL + RIGHT ARROW
             self.move_cursor_word(True)
 
+    def reverse_search(self) -> bool:
+        """ Ctrl-R: incremental search through the history, newest first.
+
+            Ctrl-R again finds the next older match, enter runs the match,
+            tab or an arrow key keeps it for editing and ctrl-g cancels.
+            Returns whether the match should be run straight away. """
+
+        query = ""
+        match = ""
+        start = 0
+        original = self.inp
+
+        while True:
+            line = "(search)`{}': {}".format(query, match)
+            stdout.write(self.renderer.render(line, len(line)))
+            stdout.flush()
+
+            ch = self.getch()
+
+            if ch in (0, 224):
+                self.getch()  # drop the scan code
+                break
+
+            ch = chr(ch)
+
+            if ch in ("\r", "\n", "\t"):
+                break
+            elif ch == "\x07":  # CTRL + G
+                match = original
+                break
+            elif ch == "\x12":  # CTRL + R
+                found = self.prev_input.search(query, start)
+            else:
+                if ch == "\b":
+                    query = query[:-1]
+                elif ch.isprintable():
+                    query += ch
+
+                found = self.prev_input.search(query)
+
+            if found is not None:
+                match, start = found
+
+        self.inp = match
+        self.pos = len(match)
+
+        return ch in ("\r", "\n")
+
     def append_ch(self, ch) -> None:
         self.autofill_count = 0
         self.autofill_cycle = False
@@ -301,13 +646,22 @@ class Scanner:
             + self.inp[(self.pos-1):]
 
     def scan(self) -> None:
+        with raw_mode():  # switched once per line, not once per key
+            self.read_line()
+
+    def read_line(self) -> None:
         self.inp = ""
         self.pos = 0
+        self.renderer.reset()
+        self.prev_count = len(self.prev_input)
         ch = ""
 
         while ch not in ("\r", "\n"):
             inp_len = len(self.inp)
-            old_pos = self.pos
+            run_match = False
+
+            if ch != "\t":
+                self.autofill_cycle = False  # any other key ends cycling
 
             if ch == "\b":
                 self.backspace()
@@ -318,15 +672,17 @@ class Scanner:
                 self.pos += len(self.inp) - inp_len
             elif ch == "\t":
                 self.auto_fill()
-                self.pos = len(self.inp)
+            elif ch == "\x12":  # CTRL + R
+                run_match = self.reverse_search()
             else:
                 self.append_ch(ch)
 
-            stdout.write(
-                clear_out(inp_len, old_pos)
-                + self.inp + "\b" * (len(self.inp) - self.pos))
-
+            # one write per key, containing only what changed
+            stdout.write(self.renderer.render(self.inp, self.pos))
             stdout.flush()
+
+            if run_match:
+                break
             
             ch = self.getch()
             
@@ -337,11 +693,7 @@ class Scanner:
                 ch = chr(ch)
 
         if self.inp.strip():
-            if self.inp in self.prev_input:
-                del self.prev_input[self.prev_input.index(self.inp)]
-            
-            self.prev_input.append(self.inp)
-            self.prev_count = len(self.prev_input)
+            self.prev_input.add(self.inp)  # moves repeated lines to the end
 
         stdout.write("\n")
         stdout.flush()
@@ -0,0 +1,138 @@
+""" persistent command history """
+
+import os
+from bisect import bisect_right
+
+HISTORY_SIZE = 100_000  # entries kept in memory
+
+
+class History:
+    """ Command history, deduplicated and bounded to size entries.
+
+        Entries are kept in an insertion ordered dict (oldest first) so
+        re-adding a line moves it to the end in O(1). If path is given,
+        every new entry is appended to that file and it is rewritten
+        only once it holds twice as many lines as the history keeps. """
+
+    def __init__(self, path: str | None = None,
+                 size: int = HISTORY_SIZE) -> None:
+        self.path = path
+        self.size = size
+        self.entries: dict[str, None] = {}
+        self.file_lines = 0
+
+        self._list = None    # entries as a list, for indexing
+        self._corpus = None  # search index, see _build_index
+
+        if path is not None:
+            self.load()
+
+    def load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8",
+                      errors="replace") as fp:
+                lines = fp.read().splitlines()
+        except OSError:
+            return
+
+        self.file_lines = len(lines)
+
+        for line in lines[-self.size:]:
+            self._add(line)
+
+    def _add(self, line: str) -> None:
+        self.entries.pop(line, None)
+        self.entries[line] = None
+
+        if len(self.entries) > self.size:
+            del self.entries[next(iter(self.entries))]
+
+        self._list = None
+        self._corpus = None
+
+    def add(self, line: str) -> None:
+        self._add(line)
+
+        if self.path is None:
+            return
+
+        try:
+            with open(self.path, "a", encoding="utf-8") as fp:
+                fp.write(line + "\n")
+        except OSError:
+            return  # history still works for this session
+
+        self.file_lines += 1
+
+        if self.file_lines > 2 * self.size:
+            self.compact()
+
+    def compact(self) -> None:
+        """ Rewrites the history file with only the kept entries. """
+
+        tmp = self.path + ".tmp"
+
+        try:
+            with open(tmp, "w", encoding="utf-8") as fp:
+                fp.writelines(line + "\n" for line in self.entries)
+
+            os.replace(tmp, self.path)
+        except OSError:
+            return
+
+        self.file_lines = len(self.entries)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __getitem__(self, index: int) -> str:
+        if self._list is None:
+            self._list = list(self.entries)
+
+        return self._list[index]
+
+    def __contains__(self, line: str) -> bool:
+        return line in self.entries
+
+    def _build_index(self) -> None:
+        """ Joins every entry, newest first, into one string so a search
+            is a single str.find, and keeps where each entry starts. """
+
+        newest = list(reversed(self.entries))
+        self._corpus = "\n" + "\n".join(newest) + "\n"
+        self._starts = []
+
+        offset = 1
+
+        for line in newest:
+            self._starts.append(offset)
+            offset += len(line) + 1
+
+        self._newest = newest
+
+    def search(self, query: str, start: int = 0,
+               prefix: bool = False) -> tuple[str, int] | None:
+        """ Finds the most recent entry containing (or starting with) query,
+            skipping entries before offset start.
+
+            Returns the entry and the offset to pass to find the next
+            older match, or None if nothing matches. """
+
+        if not query:
+            return None
+
+        if self._corpus is None:
+            self._build_index()
+
+        found = self._corpus.find("\n" + query if prefix else query, start)
+
+        if found == -1:
+            return None
+
+        if prefix:
+            found += 1
+
+        n = bisect_right(self._starts, found) - 1
+        line = self._newest[n]
+
+        return line, self._starts[n] + len(line)
@@ -0,0 +1,147 @@
+""" background jobs (similar to job control in POSIX shells)
+    and parallel blocks """
+
+import os
+from signal import SIGINT
+from subprocess import run, Popen, PIPE, STDOUT, DEVNULL
+from typing import Iterator, TextIO
+
+WINDOWS = os.name == "nt"
+
+# keeps ctrl + c at the prompt from reaching background jobs
+if WINDOWS:
+    from signal import CTRL_BREAK_EVENT
+    from subprocess import CREATE_NEW_PROCESS_GROUP
+
+    DETACHED = {"creationflags": CREATE_NEW_PROCESS_GROUP}
+else:
+    DETACHED = {"start_new_session": True}
+
+
+class Job:
+    """ The processes started by one background command. """
+
+    def __init__(self, id_: int, command: str, procs: list[Popen]) -> None:
+        self.id = id_
+        self.command = command
+        self.procs = procs
+
+    def poll(self) -> int | None:
+        """ Returns the exit status of the job, or None while any of
+            its processes is still running. """
+
+        for proc in self.procs:
+            if proc.poll() is None:
+                return None
+
+        return self.procs[-1].returncode  # status of a pipeline is its last
+
+    def wait(self) -> int:
+        for proc in self.procs:
+            proc.wait()
+
+        return self.procs[-1].returncode
+
+    def interrupt(self) -> None:
+        for proc in self.procs:
+            if proc.poll() is None:
+                proc.send_signal(CTRL_BREAK_EVENT if WINDOWS else SIGINT)
+
+    def status(self) -> str:
+        status = self.poll()
+
+        if status is None:
+            return "Running"
+        if status == 0:
+            return "Done"
+
+        return "Exit {}".format(status)
+
+    def __str__(self) -> str:
+        return "[{}]  {:<10}{}".format(self.id, self.status(), self.command)
+
+
+class JobTable:
+    """ Background jobs by id. Ids are reused once a job was reported. """
+
+    def __init__(self) -> None:
+        self.jobs: dict[int, Job] = {}
+
+    def add(self, command: str, procs: list[Popen]) -> Job:
+        id_ = max(self.jobs, default=0) + 1
+        job = self.jobs[id_] = Job(id_, command, procs)
+
+        return job
+
+    def get(self, spec: str | None = None) -> Job:
+        """ Returns the job spec (e.g. '2' or '%2') refers to,
+            the most recent one if spec is None. """
+
+        if not self.jobs:
+            raise ValueError("No jobs are running.")
+
+        if spec is None:
+            return self.jobs[max(self.jobs)]
+
+        try:
+            return self.jobs[int(spec.removeprefix("%"))]
+        except (ValueError, KeyError):
+            raise ValueError("No such job: {}".format(spec))
+
+    def remove(self, job: Job) -> None:
+        self.jobs.pop(job.id, None)
+
+    def finished(self) -> list[Job]:
+        """ Removes and returns every job that has finished. """
+
+        done = [job for job in self.jobs.values() if job.poll() is not None]
+
+        for job in done:
+            self.remove(job)
+
+        return done
+
+    def __iter__(self) -> Iterator[Job]:
+        return iter(list(self.jobs.values()))
+
+    def __len__(self) -> int:
+        return len(self.jobs)
+
+
+class ParallelBlock:
+    """ Programs queued inside a parallel ... end block.
+
+        They are started together once the block ends, at most workers
+        at a time, with their output captured so it can be written in
+        the order the programs were queued. """
+
+    def __init__(self, workers: int | None = None) -> None:
+        self.workers = workers or os.cpu_count() or 1
+        self.commands: list[list[str]] = []
+
+    def add(self, command: list[str]) -> None:
+        self.commands.append(command)
+
+    def run(self, out: TextIO) -> list[int]:
+        """ Runs every queued program, writing each one's output to out
+            as soon as it and every program before it finished.
+            Returns their exit statuses. """
+
+        from concurrent.futures import ThreadPoolExecutor  # slow import
+
+        def capture(command: list[str]) -> tuple[int, bytes]:
+            proc = run(command, stdin=DEVNULL, stdout=PIPE, stderr=STDOUT)
+            return proc.returncode, proc.stdout
+
+        statuses = []
+
+        with ThreadPoolExecutor(self.workers) as pool:
+            for future in [pool.submit(capture, command)
+                           for command in self.commands]:
+                status, output = future.result()
+                statuses.append(status)
+
+                out.write(output.decode("utf-8", "replace"))
+                out.flush()
+
+        return statuses
@@ -1 +1,285 @@
-raise NotImplementedError
+import os
+import ctypes
+import struct
+import termios
+from datetime import date
+from math import log, floor
+from dataclasses import dataclass
+from signal import signal, SIGINT, SIGWINCH
+from locale import setlocale, LC_ALL, Error as LocaleError
+from threading import Thread
+from time import sleep
+from select import select
+from fcntl import ioctl
+from shutil import get_terminal_size
+from contextlib import contextmanager
+from typing import Iterator
+
+from sys import stdout, stdin, platform, \
+    executable, argv
+
+
+CREATE_NEW_CONSOLE = 0  # only meaningful on Windows
+
+
+sigint_paused = False
+
+def sigint_handler(sig, frame):
+    global sigint_paused
+
+    if sigint_paused:
+        return
+
+    sigint_paused = True  # until the main loop runs the next command
+    raise KeyboardInterrupt
+
+
+def pause_sigint(paused: bool) -> None:
+    """ Ctrl + c raises KeyboardInterrupt only while not paused, it is
+        paused at the prompt and once raised. """
+
+    global sigint_paused
+    sigint_paused = paused
+
+
+signal(SIGINT, sigint_handler)
+
+try:
+    setlocale(LC_ALL, "")
+except LocaleError:
+    pass
+
+USR_PATH = os.path.normpath(os.path.expanduser("~/"))
+
+
+def format_path(path: str) -> str:
+    if path == USR_PATH or path.startswith(USR_PATH + "/"):
+        path = "~" + path[len(USR_PATH):]
+
+    return path
+
+
+@dataclass
+class Uptime:
+    secs: int
+    mins: int
+    hours: int
+    days: int
+
+
+def get_uptime() -> Uptime:
+    with open("/proc/uptime", "r") as fp:
+        secs = int(float(fp.read().split()[0]))
+
+    mins, sec = divmod(secs, 60)
+    hour, mins = divmod(mins, 60)
+    days, hour = divmod(hour, 24)
+
+    return Uptime(sec, mins, hour, days)
+
+
+def system_id() -> tuple:
+    """ Kernel, host and boot time: cheap to read, and they change on
+        every upgrade or reboot, after which probes cached across
+        sessions are redone. """
+
+    btime = None
+
+    try:
+        with open("/proc/stat", "r") as fp:
+            for line in fp:
+                if line.startswith("btime "):
+                    btime = int(line.split()[1])
+                    break
+    except OSError:
+        pass
+
+    return tuple(os.uname()) + (btime,)
+
+
+def get_screen_res() -> str:
+    """ Resolution of the first connected display, read from DRM. """
+
+    drm = "/sys/class/drm"
+
+    try:
+        connectors = sorted(os.listdir(drm))
+    except OSError:
+        return "Unknown"
+
+    for connector in connectors:
+        try:
+            with open(os.path.join(drm, connector, "status"), "r") as fp:
+                if fp.read().strip() != "connected":
+                    continue
+
+            with open(os.path.join(drm, connector, "modes"), "r") as fp:
+                mode = fp.readline().strip()
+        except OSError:
+            continue
+
+        if mode:
+            return mode
+
+    return "Unknown"
+
+
+## Console size, cached and only refreshed on SIGWINCH ##
+
+_console_size = (80, 24)
+
+
+def refresh_console_size(*_) -> None:
+    global _console_size
+
+    try:
+        rows, cols, *_ = struct.unpack(
+            "hhhh", ioctl(stdout.fileno(), termios.TIOCGWINSZ, b"\0" * 8))
+    except (OSError, ValueError):
+        cols, rows = get_terminal_size()
+
+    if cols > 0 and rows > 0:
+        _console_size = (cols, rows)
+
+
+refresh_console_size()
+signal(SIGWINCH, refresh_console_size)
+
+
+def get_console_width() -> int:
+    return _console_size[0]
+
+
+def get_console_height() -> int:
+    return _console_size[1]
+
+
+def move_cursor(x: int, y: int, relative: bool = True) -> int:
+    if relative:
+        move = ""
+
+        if x:
+            move += "\033[{}{}".format(abs(x), "C" if x > 0 else "D")
+        if y:
+            move += "\033[{}{}".format(abs(y), "B" if y > 0 else "A")
+    else:
+        move = "\033[{};{}H".format(y + 1, x + 1)
+
+    stdout.write(move)
+    return 1
+
+
+## Raw keyboard input, translated to what msvcrt.getwch returns ##
+
+# escape sequence -> windows scan code (sent after "\xe0")
+_special_keys = {
+    "[D": "K", "OD": "K",            # LEFT ARROW
+    "[C": "M", "OC": "M",            # RIGHT ARROW
+    "[A": "H", "OA": "H",            # UP ARROW
+    "[B": "P", "OB": "P",            # DOWN ARROW
+    "[1;5D": "s", "[5D": "s",        # CTRL + LEFT ARROW
+    "[1;5C": "t", "[5C": "t",        # CTRL + RIGHT ARROW
+}
+
+# windows sends "\b" for backspace and "\x7f" for ctrl + backspace,
+# terminals usually send the opposite
+_translate = {
+    "\x7f": "\b",
+    "\b": "\x7f",
+    "\n": "\r",
+}
+
+_pending = []
+
+try:
+    _tty_attrs = termios.tcgetattr(stdin.fileno())
+except (termios.error, ValueError):
+    _tty_attrs = None  # not a terminal, read input as it comes
+else:
+    _raw_attrs = termios.tcgetattr(stdin.fileno())
+    _raw_attrs[0] &= ~(termios.ICRNL | termios.IXON)  # iflag
+    _raw_attrs[3] &= ~(termios.ICANON | termios.ECHO)  # lflag, keep ISIG for ^C
+    _raw_attrs[6][termios.VMIN] = 1
+    _raw_attrs[6][termios.VTIME] = 0
+
+
+def _read_char(fd: int) -> str:
+    """ Reads one utf-8 encoded character. """
+
+    raw = os.read(fd, 1)
+
+    if not raw:
+        raise EOFError
+
+    lead = raw[0]
+    size = 1 if lead < 0xc0 else 2 if lead < 0xe0 else 3 if lead < 0xf0 else 4
+
+    while len(raw) < size:
+        raw += os.read(fd, size - len(raw))
+
+    return raw.decode("utf-8", "replace")
+
+
+def _read_escape(fd: int) -> str:
+    """ Reads the rest of an escape sequence, or "" for a lone ESC. """
+
+    seq = ""
+
+    while select([fd], [], [], 0.05)[0]:
+        seq += _read_char(fd)
+
+        if len(seq) == 1 and seq not in "[O":
+            break  # alt + key
+        if len(seq) > 1 and (seq[-1].isalpha() or seq[-1] == "~"):
+            break
+
+    return seq
+
+
+_raw = False
+
+
+@contextmanager
+def raw_mode() -> Iterator[None]:
+    """ Keeps the terminal raw (no echo or line buffering) for a whole
+        line of input, instead of switching modes around every key. """
+
+    global _raw
+
+    if _tty_attrs is None or _raw:
+        yield  # not a terminal, or already raw
+        return
+
+    fd = stdin.fileno()
+    termios.tcsetattr(fd, termios.TCSADRAIN, _raw_attrs)
+    _raw = True
+
+    try:
+        yield
+    finally:
+        _raw = False
+        termios.tcsetattr(fd, termios.TCSADRAIN, _tty_attrs)
+
+
+def getch() -> str:
+    if _pending:
+        return _pending.pop()
+
+    fd = stdin.fileno()
+
+    with raw_mode():
+        ch = _read_char(fd)
+
+        if ch != "\x1b":
+            return _translate.get(ch, ch)
+
+        seq = _read_escape(fd)
+
+    if seq == "\x7f":
+        return "\x7f"  # alt + backspace, remove word
+
+    if seq in _special_keys:
+        _pending.append(_special_keys[seq])
+        return "\xe0"
+
+    return "\x1b"  # unsupported key, ignored by the scanner
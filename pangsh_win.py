@@ -7,10 +7,12 @@ from dataclasses import dataclass
 from signal import signal, SIGINT
 from locale import setlocale, LC_ALL
 from threading import Thread
-from time import sleep
+from time import sleep, time
 from msvcrt import getwch as getch
+from subprocess import CREATE_NEW_CONSOLE
+from contextlib import nullcontext
 
-from sys import stdout, platform, \
+from sys import stdout, platform, getwindowsversion, \
     executable, argv
 
 
@@ -22,10 +24,18 @@ def sigint_handler(sig, frame):
     if sigint_paused:
         return
 
-    sigint_paused = True
+    sigint_paused = True  # until the main loop runs the next command
     raise KeyboardInterrupt
 
 
+def pause_sigint(paused: bool) -> None:
+    """ Ctrl + c raises KeyboardInterrupt only while not paused, it is
+        paused at the prompt and once raised. """
+
+    global sigint_paused
+    sigint_paused = paused
+
+
 signal(SIGINT, sigint_handler)
 setlocale(LC_ALL, ".utf-8")
 
@@ -33,9 +43,22 @@ gHandle = ctypes.windll.kernel32.GetStdHandle(
     ctypes.c_long(-11))
 ctypes.windll.kernel32.SetConsoleMode(gHandle, 7)
 
+# utf-8 code page, same as 'chcp 65001' without spawning a process
+ctypes.windll.kernel32.SetConsoleCP(65001)
+ctypes.windll.kernel32.SetConsoleOutputCP(65001)
+
+# a c_int by default, which wraps after 24.8 days of uptime
+ctypes.windll.kernel32.GetTickCount64.restype = ctypes.c_ulonglong
+
 USR_PATH = os.path.normpath(os.path.expanduser("~/"))
 
 
+def raw_mode() -> nullcontext:
+    """ Keys read through getwch are always raw, nothing to switch. """
+
+    return nullcontext()
+
+
 def format_path(path: str) -> str:
     if path.startswith(USR_PATH):
         path = "~/" + path.lstrip(USR_PATH)
@@ -66,6 +89,17 @@ def get_uptime() -> Uptime:
     return Uptime(sec, mins, hour, days)
 
 
+def system_id() -> tuple:
+    """ Windows version and boot time: cheap to read, and they change on
+        every upgrade or reboot, after which probes cached across
+        sessions are redone. """
+
+    ticks = ctypes.windll.kernel32.GetTickCount64()
+    boot = round((time() * 1000 - ticks) / 60000)  # to the minute, as the
+                                                   # two clocks drift apart
+    return tuple(getwindowsversion()) + (boot,)
+
+
 def get_screen_res() -> str:
     user32 = ctypes.windll.user32
     user32.SetProcessDPIAware()
@@ -79,25 +113,57 @@ def get_console_info() -> tuple:
         gHandle, csbi)
 
     if not res:
-        raise
+        raise ctypes.WinError()
 
     return struct.unpack("hhhhHhhhhhh", csbi.raw)
 
 
+## Console geometry, cached so key presses never query the console ##
+
+_console_size = (80, 25)
+
+
+def refresh_console_size() -> None:
+    """ Re-reads the console size, called once per prompt as console
+        resize events are not delivered through getwch. """
+
+    global _console_size
+
+    try:
+        width, _, _, _, _, _, top, _, bottom, *_ = get_console_info()
+    except OSError:
+        return  # not attached to a console, keep the last size
+
+    _console_size = (width, bottom - top + 1)
+
+
 def move_cursor(x: int, y: int, relative: bool = True) -> int:
     if relative:
-        width, height, curx, cury, *_ = get_console_info()
+        # virtual terminal sequences are enabled by SetConsoleMode above,
+        # so relative moves need no round trip to read the cursor position
+        move = ""
+
+        if x:
+            move += "\033[{}{}".format(abs(x), "C" if x > 0 else "D")
+        if y:
+            move += "\033[{}{}".format(abs(y), "B" if y > 0 else "A")
 
-        move = (x + curx) + ((y + cury) << 16)
-    else:
-        move = x + (y << 16)
+        stdout.write(move)
+        return 1
 
     return ctypes.windll.kernel32. \
         SetConsoleCursorPosition(
             gHandle,
-            ctypes.c_ulong(move)
+            ctypes.c_ulong(x + (y << 16))
         )
 
 
 def get_console_width() -> int:
-    return get_console_info()[0]
+    return _console_size[0]
+
+
+def get_console_height() -> int:
+    return _console_size[1]
+
+
+refresh_console_size()
@@ -1,12 +1,25 @@
 """ command prompt """
 
-from subprocess import run, list2cmdline, \
-    CREATE_NEW_CONSOLE, Popen
+from time import perf_counter
 
-from socket import gethostname
-from enum import Enum, auto
+STARTED = perf_counter()  # for --startup-profile, before the other imports
+
+from subprocess import run, list2cmdline, Popen, PIPE, DEVNULL
+from sys import stderr
+
+import re
+import pickle
+from dataclasses import dataclass, field
 from typing import Any
 from helpers import *
+from script_cache import ScriptCache
+from variables import Variables
+from commands import CommandCache
+from history import History
+from completion import Completer
+from jobs import JobTable, ParallelBlock, DETACHED
+from privilege import TokenPrivileges, SudoHelper, WINDOWS
+from workers import WorkerPool
 
 try:
     from sys import set_int_max_str_digits
@@ -17,40 +30,83 @@ except ImportError:
 # basic lexical analyser
 
 
-class TokenType(Enum):
-    STRING = auto()
-    NUM = auto()
-
-    ID = auto()
-    KEYWORD = auto()
-    VARIABLE = auto()
-    END_OF_LINE = auto()
-    SEMICOLON = auto()
-
-    EQ = auto()
-    SET = auto()
-    ADD = auto()
-    SUB = auto()
-    MUL = auto()
-    DIV = auto()
-    MOD = auto()
-    POW = auto()
-
-    IADD = auto()
-    ISUB = auto()
-    IMUL = auto()
-    IDIV = auto()
-    IMOD = auto()
-    IPOW = auto()
-    LPAREN = auto()
-    RPAREN = auto()
-
-    WHITESPACE = auto()
-
-
-@dataclass
+class TokenType:
+    """ Token types, int-coded so comparisons in the parser are cheap. """
+
+    STRING = 0
+    NUM = 1
+
+    ID = 2
+    KEYWORD = 3
+    VARIABLE = 4
+    END_OF_LINE = 5
+    SEMICOLON = 6
+
+    EQ = 7
+    SET = 8
+    ADD = 9
+    SUB = 10
+    MUL = 11
+    DIV = 12
+    MOD = 13
+    POW = 14
+
+    IADD = 15
+    ISUB = 16
+    IMUL = 17
+    IDIV = 18
+    IMOD = 19
+    IPOW = 20
+    LPAREN = 21
+    RPAREN = 22
+
+    WHITESPACE = 23
+
+    PIPE = 24
+    REDIRECT_IN = 25
+    REDIRECT_OUT = 26
+    REDIRECT_APPEND = 27
+    BACKGROUND = 28
+
+    NE = 29
+    LE = 30
+    GE = 31
+
+
+# in-place operator -> the operator it applies, e.g. += -> +
+_inplace_operators = {
+    TokenType.IADD: TokenType.ADD,
+    TokenType.ISUB: TokenType.SUB,
+    TokenType.IMUL: TokenType.MUL,
+    TokenType.IDIV: TokenType.DIV,
+    TokenType.IMOD: TokenType.MOD,
+    TokenType.IPOW: TokenType.POW,
+}
+
+# tokens that end a statement
+_statement_end = frozenset((TokenType.END_OF_LINE, TokenType.SEMICOLON,
+                            TokenType.BACKGROUND))
+
+# tokens that connect the commands of a pipeline
+_pipe_tokens = frozenset((TokenType.PIPE, TokenType.REDIRECT_IN,
+                          TokenType.REDIRECT_OUT, TokenType.REDIRECT_APPEND))
+
+# tokens that end a single command
+_stage_end = _statement_end | _pipe_tokens
+
+# names kept as python (not quoted) in conditions, e.g. if $a and not $b
+_expr_names = frozenset(("and", "or", "not", "in", "is",
+                         "True", "False", "None"))
+
+# keywords that open, close or jump out of a block
+_block_keywords = frozenset(("if", "else", "while", "for", "func", "end",
+                             "return", "break", "continue",
+                             "set", "parallel"))
+
+
+@dataclass(slots=True)
 class Token:
-    type_: TokenType
+    type_: int
     value: int | str
 
 
@@ -78,7 +134,7 @@ class Lexer:
 
         return ""
 
-    def atom(self, type_: TokenType) -> None:
+    def atom(self, type_: int) -> None:
         self.toks.append(Token(type_, self._get()))
 
     def identifier(self) -> None:
@@ -128,7 +184,7 @@ class Lexer:
 
         self.toks.append(Token(TokenType.STRING, raw))
 
-    def ieq(self, cur: str, normal: TokenType, inormal: TokenType) -> None:
+    def ieq(self, cur: str, normal: int, inormal: int) -> None:
         self._get()
 
         if self._peek() == "=":
@@ -180,6 +236,31 @@ class Lexer:
                 self.atom(TokenType.RPAREN)
             elif cur == ";":
                 self.atom(TokenType.SEMICOLON)
+            elif cur == "|":
+                self.atom(TokenType.PIPE)
+            elif cur == "&":
+                self.atom(TokenType.BACKGROUND)
+            elif cur == "<":
+                self.ieq(cur, TokenType.REDIRECT_IN, TokenType.LE)
+            elif cur == ">":
+                self._get()
+
+                if self._peek() == ">":
+                    self.toks.append(Token(TokenType.REDIRECT_APPEND, ">>"))
+                    self._get()
+                elif self._peek() == "=":
+                    self.toks.append(Token(TokenType.GE, ">="))
+                    self._get()
+                else:
+                    self.toks.append(Token(TokenType.REDIRECT_OUT, ">"))
+            elif cur == "!":
+                self._get()
+
+                if self._peek() != "=":
+                    raise SyntaxError("Unrecognised character: !")
+
+                self.toks.append(Token(TokenType.NE, "!="))
+                self._get()
             elif cur == "*":
                 self._get()
 
@@ -196,6 +277,117 @@ class Lexer:
         self.toks.append(Token(TokenType.END_OF_LINE, ""))
 
 
+# fast lexer: same tokens as Lexer, but token boundaries are found with
+# precompiled regexes and a character class table instead of char by char
+
+_WS_RE = re.compile(r"[ \t]+")
+_IDENT_RE = re.compile(r"[.@/_a-zA-Z0-9]*")
+_NUM_RE = re.compile(r"[0-9]+(?:\.[0-9]*)?")
+_OP_RE = re.compile(r"\*\*=?|\*=?|[=+\-/%<]=?|>[>=]?|!=")
+
+_operators = {
+    "=": TokenType.SET,   "==": TokenType.EQ,
+    "+": TokenType.ADD,   "+=": TokenType.IADD,
+    "-": TokenType.SUB,   "-=": TokenType.ISUB,
+    "*": TokenType.MUL,   "*=": TokenType.IMUL,
+    "/": TokenType.DIV,   "/=": TokenType.IDIV,
+    "%": TokenType.MOD,   "%=": TokenType.IMOD,
+    "**": TokenType.POW,  "**=": TokenType.IPOW,
+    "<": TokenType.REDIRECT_IN,   "<=": TokenType.LE,
+    ">": TokenType.REDIRECT_OUT,  ">=": TokenType.GE,
+    ">>": TokenType.REDIRECT_APPEND,
+    "!=": TokenType.NE,
+}
+
+_atoms = {
+    "(": TokenType.LPAREN,
+    ")": TokenType.RPAREN,
+    ";": TokenType.SEMICOLON,
+    "|": TokenType.PIPE,
+    "&": TokenType.BACKGROUND,
+}
+
+_WS, _IDENT, _NUM, _STRING, _OP, _ATOM = range(6)
+
+_char_class = {}
+_char_class.update(dict.fromkeys(" \t", _WS))
+_char_class.update(dict.fromkeys(
+    ".@$_abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ", _IDENT))
+_char_class.update(dict.fromkeys("0123456789", _NUM))
+_char_class.update(dict.fromkeys("\"", _STRING))
+_char_class.update(dict.fromkeys("=+-*/%<>!", _OP))
+_char_class.update(dict.fromkeys(_atoms, _ATOM))
+
+_keyword_set = frozenset(keywords)
+
+
+class FastLexer(Lexer):
+    def lex(self) -> None:
+        src = self.src
+        size = self.size
+        append = self.toks.append
+        ind = 0
+
+        while ind < size:
+            cur = src[ind]
+            kind = _char_class.get(cur)
+
+            if kind == _WS:
+                if cur == " " and src[ind + 1:ind + 2] != " " \
+                        and src[ind + 1:ind + 2] != "\t":
+                    end = ind + 1  # the common single space, no regex
+                    append(Token(TokenType.WHITESPACE, 1))
+                    ind = end
+                    continue
+
+                end = _WS_RE.match(src, ind).end()
+                spaces = src.count(" ", ind, end)
+                append(Token(TokenType.WHITESPACE,
+                             spaces + 4 * (end - ind - spaces)))
+            elif kind == _IDENT:
+                end = _IDENT_RE.match(src, ind + 1).end()
+                raw = src[ind:end]
+
+                if cur == "$":
+                    append(Token(TokenType.VARIABLE, raw[1:]))
+                elif raw in _keyword_set:
+                    append(Token(TokenType.KEYWORD, raw))
+                else:
+                    append(Token(TokenType.ID, raw))
+            elif kind == _NUM:
+                end = _NUM_RE.match(src, ind).end()
+                raw = src[ind:end]
+                append(Token(TokenType.NUM,
+                             float(raw) if "." in raw else int(raw)))
+            elif kind == _STRING:
+                end = src.find("\"", ind + 1)
+
+                if end == -1:
+                    raise SyntaxError("EOL before termination of string")
+
+                append(Token(TokenType.STRING, src[ind + 1:end]))
+                end += 1
+            elif kind == _OP:
+                match = _OP_RE.match(src, ind)
+
+                if match is None:  # a lone !
+                    raise SyntaxError("Unrecognised character: {}".format(cur))
+
+                end = match.end()
+                raw = src[ind:end]
+                append(Token(_operators[raw], raw))
+            elif kind == _ATOM:
+                end = ind + 1
+                append(Token(_atoms[cur], cur))
+            else:
+                raise SyntaxError("Unrecognised character: {}".format(cur))
+
+            ind = end
+
+        self.ind = ind
+        append(Token(TokenType.END_OF_LINE, ""))
+
+
 ### SRC: ###
 # a = 5 * (10 + 20) # 1
 # b = 5 - $a        # 2
@@ -219,29 +411,106 @@ class Lexer:
 #   )
 # ]
 
-@dataclass
+### Control flow: ###
+# Lines are parsed on their own, then a Compiler turns the nodes of
+# a whole script into one flat instruction list:
+#
+# i = 0                 # 0 Assign("i", "0")
+# while $i < 3          # 1 Branch("{} < 3", ["i"], target=4)
+#     i += 1            # 2 Assign("i", "{} + 1", ["i"])
+# end                   # 3 Jump(1)
+# echo $i               # 4 Keyword("echo", "{}", ["i"])
+
+### Pipelines: ###
+# type log.txt | grep error > errors.txt
+# Pipeline(
+#   [Keyword("type", ...), Program(["grep", "error"])],
+#   stdout=Redirect(["errors.txt"])
+# )
+
+def substitution_plan(args: list[str],
+                      variables: list[str] | None) -> tuple:
+    """ Returns (index, variable) for each {} placeholder in args. """
+
+    if not variables:
+        return ()
+
+    return tuple(zip((n for n, arg in enumerate(args) if arg == "{}"),
+                     variables))
+
+
+@dataclass(slots=True)
 class Assign:
     name: str
     expr: str
     variables: list[str] | None = None
 
 
-@dataclass
+@dataclass(slots=True)
 class Keyword:
     name: str
     expr: str | list[str]
     variables: list[str] | None = None
     sudo: bool = False
 
+    # resolved once when parsed, not every time the keyword runs
+    handler: Any = field(default=None, init=False, compare=False)
+    plan: tuple = field(default=(), init=False, compare=False)
+
+    def __post_init__(self) -> None:
+        self.handler = _keyword_handlers.get(self.name)
+
+        if type(self.expr) is list:
+            self.plan = substitution_plan(self.expr, self.variables)
+
 
-@dataclass
+@dataclass(slots=True)
 class Program:
     args: str
     variables: list[str] | None = None
     sudo: bool = False
 
+    plan: tuple = field(default=(), init=False, compare=False)
+
+    def __post_init__(self) -> None:
+        self.plan = substitution_plan(self.args, self.variables)
+
+
+@dataclass(slots=True)
+class Redirect:
+    target: list[str]  # parts of the file name, {} means a variable
+    variables: list[str] | None = None
+    append: bool = False
+
+
+@dataclass(slots=True)
+class Pipeline:
+    stages: list[Keyword | Program]
+    stdin: Redirect | None = None
+    stdout: Redirect | None = None
+    sudo: bool = False
+
 
-ASTNode = Assign | Keyword | Program
+@dataclass(slots=True)
+class Background:
+    node: Program | Pipeline
+    sudo: bool = False
+
+
+@dataclass(slots=True)
+class For:
+    name: str
+    expr: str
+    variables: list[str] | None = None
+
+
+@dataclass(slots=True)
+class Func:
+    name: str
+    params: list[str]
+
+
+ASTNode = Assign | Keyword | Program | Pipeline | Background | For | Func
 
 
 class Parser:
@@ -263,23 +532,35 @@ class Parser:
         except IndexError:
             self.cur = Token(TokenType.END_OF_LINE, "")
 
-    def parse_expr(self) -> tuple[str, list | None]:
+    def peek_type(self) -> int:
+        if self.ind + 1 < len(self.toks):
+            return self.toks[self.ind + 1].type_
+
+        return TokenType.END_OF_LINE
+
+    def parse_expr(self, condition: bool = False) -> tuple[str, list | None]:
+        """ Turns tokens up to the end of the command into an expression.
+
+            A condition (of if, while or for) only ends with the statement,
+            so < and > compare instead of redirecting, and 'and', 'or',
+            'not', ... and calls such as range(n) are kept as python. """
+
+        end = _statement_end if condition else _stage_end
         expr = ""
         variables = []
 
-        while self.cur.type_ not in (
-                TokenType.END_OF_LINE,
-                TokenType.SEMICOLON):
-
-            if self.cur.type_ == TokenType.VARIABLE:
+        while (type_ := self.cur.type_) not in end:
+            if type_ == TokenType.VARIABLE:
                 expr += "{}"
                 variables.append(self.cur.value)
-            elif self.cur.type_ == TokenType.WHITESPACE:
+            elif type_ == TokenType.WHITESPACE:
                 expr += " " * self.cur.value  # depth of whitespace
-            elif self.cur.type_ == TokenType.STRING:
-                expr += "\"{}\"".format(self.cur.value)
-            elif self.cur.type_ == TokenType.ID:
-                expr += "\"{}\"".format(self.cur.value)
+            elif condition and type_ == TokenType.ID and (
+                    self.cur.value in _expr_names
+                    or self.peek_type() == TokenType.LPAREN):
+                expr += self.cur.value
+            elif type_ in (TokenType.STRING, TokenType.ID, TokenType.KEYWORD):
+                expr += "\"{}\"".format(self.cur.value)  # e.g. set ls
             else:
                 expr += str(self.cur.value)
 
@@ -313,15 +594,72 @@ class Parser:
         self.inc()
 
         if keyword in ("echo", "cd", "touch",
-                       "type", "title", "del",
+                       "title", "del",
                        "set",  "@echo"):
             self.ast.append(Keyword(keyword, *self.parse_expr(), self.sudo))
-        elif keyword in ("rm", "ls"):
+        elif keyword in ("if", "while"):
+            expr, variables = self.parse_expr(True)
+
+            if not expr:
+                raise SyntaxError("'{}' needs a condition.".format(keyword))
+
+            self.ast.append(Keyword(keyword, expr, variables, self.sudo))
+        elif keyword == "for":
+            self.parse_for()
+        elif keyword == "func":
+            self.parse_func()
+        elif keyword in ("rm", "ls", "type", "hash",
+                         "wait", "fg", "parallel", "resident"):
             self.ast.append(
                 Keyword(keyword, *self.parse_expr_no_eval(), self.sudo))
         else:
             self.ast.append(Keyword(keyword, "", None, self.sudo))
 
+    def parse_for(self) -> None:
+        self.skip_whitespace()
+
+        if self.cur.type_ != TokenType.ID:
+            raise SyntaxError("Expected a variable name after 'for'.")
+
+        name = self.cur.value
+
+        self.inc()
+        self.skip_whitespace()
+
+        if self.cur.type_ != TokenType.ID or self.cur.value != "in":
+            raise SyntaxError("Expected 'in' after '{}'.".format(name))
+
+        self.inc()
+
+        expr, variables = self.parse_expr(True)
+
+        if not expr:
+            raise SyntaxError("Nothing to loop over.")
+
+        self.ast.append(For(name, expr, variables))
+
+    def parse_func(self) -> None:
+        self.skip_whitespace()
+
+        if self.cur.type_ != TokenType.ID:
+            raise SyntaxError("Expected a function name after 'func'.")
+
+        name = self.cur.value
+        params = []
+
+        self.inc()
+
+        while (type_ := self.cur.type_) not in _stage_end:
+            if type_ == TokenType.ID:
+                params.append(self.cur.value)
+            elif type_ != TokenType.WHITESPACE:
+                raise SyntaxError("Parameters of '{}' must be names.".format(
+                    name))
+
+            self.inc()
+
+        self.ast.append(Func(name, params))
+
     def skip_whitespace(self) -> None:
         if self.cur.type_ == TokenType.WHITESPACE:
             self.inc()
@@ -342,14 +680,12 @@ class Parser:
 
         self.skip_whitespace()
 
-        if self.cur.type_ in (TokenType.IADD, TokenType.ISUB,
-                              TokenType.IMUL, TokenType.IDIV,
-                              TokenType.IMOD, TokenType.IPOW):
+        if self.cur.type_ in _inplace_operators:
             self.toks[self.ind] = Token(TokenType.SET, "=")
 
             self.toks.insert(self.ind + 1, Token(TokenType.VARIABLE, args[0]))
-            self.toks.insert(self.ind + 2, Token(getattr(TokenType,
-                             self.cur.type_._name_[1:]), self.cur.value[:-1]))
+            self.toks.insert(self.ind + 2, Token(
+                _inplace_operators[self.cur.type_], self.cur.value[:-1]))
 
             self.cur = self.toks[self.ind]
 
@@ -359,19 +695,23 @@ class Parser:
         
         arg = ""
         
-        while self.cur.type_ not in (
-                TokenType.END_OF_LINE,
-                TokenType.SEMICOLON):
-            
-            if self.cur.type_ == TokenType.WHITESPACE and arg:
-                args.append(arg)
-                arg = ""
-            elif self.cur.type_ == TokenType.STRING:
+        while (type_ := self.cur.type_) not in _stage_end:
+            if type_ == TokenType.WHITESPACE:
+                if arg:
+                    args.append(arg)
+                    arg = ""
+            elif type_ == TokenType.STRING:
                 args.append(self.cur.value)
                 arg = ""
-            elif self.cur.type_ == TokenType.NUM:
-                args.append(str(self.cur.value))
-                arg = ""
+            elif type_ == TokenType.NUM:
+                arg += str(self.cur.value)  # part of e.g. -3
+            elif type_ == TokenType.VARIABLE:
+                if arg:
+                    args.append(arg)
+                    arg = ""
+
+                args.append("{}")
+                variables.append(self.cur.value)
             else:
                 arg += self.cur.value
 
@@ -390,6 +730,95 @@ class Parser:
 
         self.ast.append(Program(*expr, self.sudo))
 
+    def parse_stage(self) -> Keyword | Program:
+        """ Parses the command after a '|' and returns it. """
+
+        self.skip_whitespace()
+        size = len(self.ast)
+
+        if self.cur.type_ == TokenType.KEYWORD:
+            self.parse_keyword()
+        elif self.cur.type_ in (TokenType.ID, TokenType.VARIABLE,
+                                TokenType.STRING):
+            self.parse_program()
+
+        if len(self.ast) == size:
+            raise SyntaxError("Expected a command after '|'.")
+
+        stage = self.ast.pop()
+
+        if type(stage) is Assign:
+            raise SyntaxError("Cannot pipe into an assignment.")
+        if type(stage) is Keyword:
+            raise SyntaxError("'{}' cannot read from a pipe.".format(
+                stage.name))
+
+        return stage
+
+    def parse_target(self) -> Redirect:
+        """ Parses the file name after '<', '>' or '>>'. """
+
+        self.skip_whitespace()
+
+        target = []
+        variables = []
+
+        while (type_ := self.cur.type_) not in _stage_end \
+                and type_ != TokenType.WHITESPACE:
+            if type_ == TokenType.VARIABLE:
+                target.append("{}")
+                variables.append(self.cur.value)
+            else:
+                target.append(str(self.cur.value))
+
+            self.inc()
+
+        if not target:
+            raise SyntaxError("Expected a file to redirect to.")
+
+        return Redirect(target, variables or None)
+
+    def parse_pipeline(self) -> None:
+        if not self.ast or type(self.ast[-1]) is Assign:
+            raise SyntaxError("Cannot pipe an assignment.")
+
+        first = self.ast[-1]
+
+        if type(first) not in (Keyword, Program) or (
+                type(first) is Keyword and first.name in _block_keywords):
+            raise SyntaxError("Blocks cannot be piped.")
+
+        node = Pipeline([self.ast.pop()], sudo=self.sudo)
+
+        while (type_ := self.cur.type_) in _pipe_tokens:
+            self.inc()
+
+            if type_ == TokenType.PIPE:
+                node.stages.append(self.parse_stage())
+            elif type_ == TokenType.REDIRECT_IN:
+                node.stdin = self.parse_target()
+            else:
+                node.stdout = self.parse_target()
+                node.stdout.append = type_ == TokenType.REDIRECT_APPEND
+
+            self.skip_whitespace()
+
+        if node.stdin is not None and type(node.stages[0]) is Keyword:
+            raise SyntaxError("'{}' cannot read from a file.".format(
+                node.stages[0].name))
+
+        self.ast.append(node)
+
+    def parse_background(self) -> None:
+        node = self.ast[-1]
+
+        if type(node) not in (Program, Pipeline) or (
+                type(node) is Pipeline and type(node.stages[0]) is Keyword):
+            raise SyntaxError(
+                "Only programs and pipelines can run in the background.")
+
+        self.ast[-1] = Background(node, self.sudo)
+
     def parse(self) -> None:
         while self.cur.type_ != TokenType.END_OF_LINE:
             self.sudo = False
@@ -399,87 +828,469 @@ class Parser:
                 self.skip_whitespace()
                 self.sudo = True
 
+                if self.cur.type_ in _statement_end:
+                    # sudo on its own opens a sudo block
+                    self.ast.append(Keyword("sudo", "", None, True))
+
+            size = len(self.ast)
+
             if self.cur.type_ == TokenType.KEYWORD:
                 self.parse_keyword()
             elif self.cur.type_ in (TokenType.ID, TokenType.VARIABLE,
                                     TokenType.STRING):
                 self.parse_program()
 
+            if len(self.ast) > size:
+                self.skip_whitespace()
+
+                if self.cur.type_ in _pipe_tokens:
+                    self.parse_pipeline()
+
+                if self.cur.type_ == TokenType.BACKGROUND:
+                    self.parse_background()
+
             if self.cur.type_ == TokenType.END_OF_LINE:
                 break
 
             self.inc()
 
 
+# instructions the compiler adds to the parsed nodes, targets are
+# indexes into the same instruction list
+
+
+@dataclass(slots=True)
+class Jump:
+    target: int | None = None
+
+
+@dataclass(slots=True)
+class Branch:
+    """ Jumps to target if expr is false. """
+
+    expr: str
+    variables: list[str] | None = None
+    target: int | None = None
+
+
+@dataclass(slots=True)
+class ForInit:
+    """ Pushes an iterator over expr, jumps to target if that fails. """
+
+    expr: str
+    variables: list[str] | None = None
+    target: int | None = None
+
+
+@dataclass(slots=True)
+class ForNext:
+    """ Assigns the next item to name, or pops the iterator
+        and jumps to target once it is exhausted. """
+
+    name: str
+    target: int | None = None
+
+
+@dataclass(slots=True)
+class ForPop:
+    pass
+
+
+@dataclass(slots=True)
+class Return:
+    pass
+
+
+@dataclass(slots=True)
+class Raise:
+    error: Exception
+
+
+@dataclass(slots=True)
+class Elevate:
+    """ Starts a sudo block, target is past its end. """
+
+    target: int | None = None
+
+
+@dataclass(slots=True)
+class Drop:
+    """ Ends a sudo block, or leaves it with break or continue. """
+
+
+@dataclass(slots=True)
+class Code:
+    instructions: list
+    lines: list[int] | None = None  # line of each instruction, if errors
+                                    # are recovered from line by line
+
+
+@dataclass(slots=True)
+class FuncDef:
+    name: str
+    params: list[str]
+    code: Code
+
+
+@dataclass(slots=True)
+class OpenBlock:
+    kind: str
+    start: int = 0           # where continue jumps to
+    patch: Any = None        # instruction that jumps to the end of the block
+    breaks: list | None = None
+    saved: Code | None = None  # func: the code the function is defined in
+    node: Func | None = None
+
+
+_control_blocks = frozenset(("if", "else", "while", "for", "func", "sudo"))
+
+
+class Compiler:
+    """ Turns the parsed lines of a script (or of a block typed into the
+        prompt) into one flat instruction list, where if, while and for
+        blocks are branches and jumps and a function body is its own list.
+        A sudo block is elevated once, at its start, and dropped at its end.
+
+        set and parallel blocks are still closed by the interpreter, the
+        compiler only tracks them so it knows which block an end closes.
+
+        If recover is set, errors found while compiling become Raise
+        instructions so they are reported when reached, otherwise they
+        are raised at once. """
+
+    def __init__(self, recover: bool = False) -> None:
+        self.recover = recover
+        self.code = Code([], [] if recover else None)
+        self.blocks: list[OpenBlock] = []
+
+    def is_open(self) -> bool:
+        """ Returns if more lines are needed to close every block. """
+
+        return any(block.kind in _control_blocks for block in self.blocks)
+
+    def emit(self, instruction: Any, line: int) -> Any:
+        self.code.instructions.append(instruction)
+
+        if self.code.lines is not None:
+            self.code.lines.append(line)
+
+        return instruction
+
+    def error(self, message: str, line: int) -> None:
+        if not self.recover:
+            raise SyntaxError(message)
+
+        self.emit(Raise(SyntaxError(message)), line)
+
+    def loop(self) -> OpenBlock | None:
+        """ Returns the innermost loop of the current function. """
+
+        for block in reversed(self.blocks):
+            if block.kind in ("while", "for"):
+                return block
+            if block.kind == "func":
+                break
+
+        return None
+
+    def drops(self, loop: OpenBlock) -> int:
+        """ Returns how many sudo blocks inside loop break or
+            continue leave. """
+
+        count = 0
+
+        for block in reversed(self.blocks):
+            if block is loop:
+                break
+
+            count += block.kind == "sudo"
+
+        return count
+
+    def feed(self, ast: list[ASTNode] | Exception, line: int = 0) -> None:
+        if isinstance(ast, Exception):
+            self.emit(Raise(ast), line)
+            return
+
+        for node in ast:
+            self.add(node, line)
+
+    def add(self, node: ASTNode, line: int) -> None:
+        instructions = self.code.instructions
+        kind = node.name if type(node) is Keyword else None
+
+        if kind in ("if", "while"):
+            start = len(instructions)
+            branch = self.emit(Branch(node.expr, node.variables), line)
+            self.blocks.append(OpenBlock(kind, start, branch, []))
+        elif type(node) is For:
+            init = self.emit(ForInit(node.expr, node.variables), line)
+            start = len(instructions)
+            self.emit(ForNext(node.name), line)
+            self.blocks.append(OpenBlock("for", start, init, []))
+        elif type(node) is Func:
+            self.blocks.append(OpenBlock("func", saved=self.code, node=node))
+            self.code = Code([], [] if self.recover else None)
+        elif kind == "else":
+            if not self.blocks or self.blocks[-1].kind != "if":
+                self.error("'else' without 'if'.", line)
+                return
+
+            block = self.blocks[-1]
+            jump = self.emit(Jump(), line)
+            block.patch.target = len(instructions)
+            block.kind = "else"
+            block.patch = jump
+        elif kind in ("break", "continue"):
+            block = self.loop()
+
+            if block is None:
+                self.error("'{}' outside of a loop.".format(kind), line)
+                return
+
+            for _ in range(self.drops(block)):
+                self.emit(Drop(), line)
+
+            if kind == "continue":
+                self.emit(Jump(block.start), line)
+            else:
+                if block.kind == "for":
+                    self.emit(ForPop(), line)
+
+                block.breaks.append(self.emit(Jump(), line))
+        elif kind == "return":
+            self.emit(Return(), line)  # run() drops open sudo blocks
+        elif kind == "sudo":
+            start = len(instructions)
+            elevate = self.emit(Elevate(), line)
+            self.blocks.append(OpenBlock("sudo", start, elevate))
+        elif kind == "end" and self.blocks \
+                and self.blocks[-1].kind in _control_blocks:
+            self.close(self.blocks.pop(), line)
+        else:
+            if kind == "end" and self.blocks:
+                self.blocks.pop()  # closes a set or parallel block
+            elif kind in ("set", "parallel"):
+                self.blocks.append(OpenBlock(kind))
+
+            self.emit(node, line)
+
+    def close(self, block: OpenBlock, line: int) -> None:
+        if block.kind == "func":
+            body = self.code
+            self.code = block.saved
+            self.emit(FuncDef(block.node.name, block.node.params, body), line)
+            return
+
+        if block.kind == "sudo":
+            self.emit(Drop(), line)
+            block.patch.target = len(self.code.instructions)
+            return
+
+        if block.kind in ("while", "for"):
+            self.emit(Jump(block.start), line)
+
+        end = len(self.code.instructions)
+
+        if block.kind == "for":
+            # ForNext ends the loop, ForInit skips it if it fails
+            self.code.instructions[block.start].target = end
+
+        block.patch.target = end
+
+        for jump in block.breaks or ():
+            jump.target = end
+
+    def finish(self) -> Code:
+        """ Returns the compiled code. A block that is never closed
+            is dropped, with everything after it, and reported instead. """
+
+        blocks = [block for block in self.blocks
+                  if block.kind in _control_blocks]
+
+        if blocks:
+            outer = blocks[0]
+            funcs = [block for block in blocks if block.kind == "func"]
+            code = funcs[0].saved if funcs else self.code
+
+            if outer.kind == "func":
+                cut = len(code.instructions)
+            elif outer.kind == "for":
+                cut = outer.start - 1  # the ForInit before ForNext
+            else:
+                cut = outer.start
+
+            line = code.lines[cut] if cut < len(code.lines) else \
+                (code.lines[-1] if code.lines else 0)
+
+            del code.instructions[cut:], code.lines[cut:]
+
+            self.code = code
+            self.blocks.clear()
+            self.error("'{}' is never closed with 'end'.".format(
+                outer.kind if outer.kind != "else" else "if"), line)
+
+        return self.code
+
+
+_expr_cache: dict[tuple[str, bool], tuple[Any, tuple[str, ...]]] = {}
+
+_MISSING = object()  # marks a function parameter that shadowed nothing
+
+
+def compile_expr(expr: str, variables: list[str] | None) \
+        -> tuple[Any, tuple[str, ...]]:
+    """ Returns a cached code object for expr and the names it uses.
+
+        Each {} placeholder becomes a name (_v0, _v1, ...) that is
+        bound to the variable's value when the code is evaluated. """
+
+    key = (expr, variables is not None)
+    compiled = _expr_cache.get(key)
+
+    if compiled is None:
+        src = expr
+        names = ()
+
+        if variables is not None:
+            names = tuple("_v{}".format(n) for n in range(len(variables)))
+            src = src.format(*names)
+
+        compiled = _expr_cache[key] = (compile(src, "<expr>", "eval"), names)
+
+    return compiled
+
+
 class Interpreter:
     def __init__(self) -> None:
-        self.variables = dict(os.environ)  # pre-assign environment variables
-        
+        self.variables = Variables(os.environ)  # pre-assign environment variables
+        self.script_cache = ScriptCache(os.path.join(MAIN_DIR, "__pscache__"))
+        self.commands = CommandCache()
+        self.jobs = JobTable()
+
         self.setting = []
+        self.blocks = []  # open set/parallel blocks, closed by end
+        self.functions: dict[str, FuncDef] = {}
+        self.iterators = []  # of the for loops being run
+        self.elevated = 0  # sudo statements and blocks being run
+
+        # Windows enables the token's privileges in the shell itself,
+        # elsewhere programs run with sudo are started by a root helper
+        self.privileges = TokenPrivileges() if WINDOWS else None
+        self.sudo_helper = None if WINDOWS else SudoHelper()
+
+        self.residents: set[str] = set()  # scripts run by warm workers
+        self.workers = WorkerPool()
         self.ast = []
         self.size = 0
         self.ind = 0
 
-        self.keyword_function = {
-            "rl": self.reload,
-            "cd": self.cd,
-            "ls": self.ls,
-            "rm": self.rm,
-            "del": self.del_var,
-            "set": self.set,
-            "end": self.fin,
-            "cls": self.cls,
-            "echo": self.echo,
-            "type": self.type_,
-            "touch": self.touch,
-            "title": self.title,
-            "uptime": self.uptime,
-            "neofetch": self.neofetch,
-
-            "exit": exit,
-            "@echo": self.echo_toggle,
-        }
+        self.set_builtins()
     
-    def get_setting(self) -> None:
-        return ".".join(self.setting)
+    def get_setting(self) -> str:
+        return self.setting[-1]
+
+    def scoped(self, name: str) -> str:
+        """ Returns name inside the setting being set, if any. """
+
+        if self.setting:
+            return self.get_setting() + "." + name
+
+        return name
     
     def set(self) -> None:
-        self.setting.append(self.evaluate_expr())
+        name = self.evaluate_expr()
         
-        if type(self.setting[-1]) is not str:
+        if type(name) is not str:
             raise ValueError("setting must be a string.")
-    
+
+        # keep the full dotted prefix so assignments never join the stack
+        self.setting.append(
+            self.setting[-1] + "." + name if self.setting else name)
+        self.blocks.append("set")
+
+    def parallel(self) -> None:
+        cur = self.ast[self.ind]
+        args = [arg for arg in self.expand(cur.expr, cur.plan)
+                if arg]
+
+        # set with: set parallel; workers = n; end
+        workers = args[0] if args else self.variables.get("parallel.workers")
+
+        if len(args) > 1:
+            raise SyntaxError("parallel takes at most a worker count.")
+
+        try:
+            workers = int(workers) if workers else None
+        except ValueError:
+            raise ValueError("Worker count must be a number.")
+
+        if workers is not None and workers < 1:
+            raise ValueError("Worker count must be at least 1.")
+
+        self.blocks.append(ParallelBlock(workers))
+
+    def open_parallel(self) -> ParallelBlock | None:
+        for block in reversed(self.blocks):
+            if type(block) is ParallelBlock:
+                return block
+
+        return None
+
     def fin(self) -> None:
-        if not self.setting:
+        if not self.blocks:
             raise SyntaxError("nothing was being set.")
 
-        self.setting.pop()
+        block = self.blocks.pop()
 
-    def sudo(self, toggle: bool) -> None:
-        if not self.ast[self.ind].sudo:
+        if type(block) is not ParallelBlock:
+            self.setting.pop()
             return
 
-        toggle = int(toggle)
+        stdout.flush()
+        statuses = block.run(stdout)
+
+        for command, status in zip(block.commands, statuses):
+            if status:
+                raise ValueError("'{}' exited with status {}.".format(
+                    list2cmdline(command), status))
 
-        for n in range(1, 36):
-            ctypes.windll.ntdll.RtlAdjustPrivilege(
-                ctypes.c_uint(n),
-                ctypes.c_uint(toggle),
-                ctypes.c_uint(0),
-                ctypes.byref(ctypes.c_int())
-            )
+    def elevate(self, cur: Elevate | None = None) -> None:
+        """ Enters a sudo statement or block, only the outermost one
+            changes the token. """
 
-    def evaluate_expr(self) -> Any:
-        cur = self.ast[self.ind]
+        if self.privileges is not None:
+            self.privileges.enable()
+
+        self.elevated += 1
+
+    def drop(self, cur: Drop | None = None) -> None:
+        self.elevated -= 1
+
+        if self.privileges is not None:
+            self.privileges.disable()
+
+    def through_helper(self) -> bool:
+        """ Returns if programs have to be run by the sudo helper. """
 
-        res = cur.expr
+        return self.elevated > 0 and self.sudo_helper is not None
 
-        if cur.variables is not None:
-            variables = [repr(self.variables[var]) for var in cur.variables]
-            res = res.format(*variables)
+    def evaluate_expr(self, cur: Any = None) -> Any:
+        if cur is None:
+            cur = self.ast[self.ind]
+
+        code, names = compile_expr(cur.expr, cur.variables)
+
+        if names:
+            # bind values directly, no repr/eval round trip
+            variables = self.variables
+            names = {name: variables[var]
+                     for name, var in zip(names, cur.variables)}
+        else:
+            names = None
 
         try:
-            res = eval(res)
+            res = eval(code, globals(), names)
             return res if type(res) is not bool else int(res)
         except Exception as error:
             raise SyntaxError(error)
@@ -499,13 +1310,10 @@ class Interpreter:
 
     def del_var(self) -> None:
         varname = self.evaluate_expr()
-        deleted = False
-        
-        for var in list(self.variables.keys()):  # cast to list so if dict changes size no error occurs
-            if var.startswith("{}.".format(varname)):
-                deleted = True
-                print("Deleting: {}".format(var))
-                del self.variables[var]
+        deleted = self.variables.delete_tree(varname)  # no scan of every variable
+
+        for var in deleted:
+            print("Deleting: {}".format(var))
 
         if deleted and varname not in self.variables:
             return  # dont raise an error as we deleted the setting instead
@@ -513,13 +1321,16 @@ class Interpreter:
         del self.variables[varname]
 
     def reload(self):
-        Popen(
-            list2cmdline([executable] + argv +
-                         ["--vars", str(self.variables)]),
-            creationflags=CREATE_NEW_CONSOLE
-        )
+        args = [executable, os.path.join(MAIN_DIR, "pangshell.py")] \
+            + argv[1:] + ["--state", save_state(self)]
+
+        stdout.flush()
+
+        if platform == "win32":
+            Popen(args, creationflags=CREATE_NEW_CONSOLE)
+            exit(0)
 
-        exit(0)
+        os.execv(executable, args)  # same process and terminal
 
     def rm(self) -> None:
         args = self.ast[self.ind].expr
@@ -566,40 +1377,28 @@ class Interpreter:
             uptime.days, uptime.hours, uptime.mins, uptime.secs))
 
     def neofetch(self) -> None:
-        info = uname()
-        uptime = get_uptime()
-
-        logo = open(self.variables["info.logo"], "r").read().split("\n")
+        logo = self.variables["info.logo"]
 
         try:
             ver = VERSION
         except NameError:
             ver = self.variables["info.ver"]
 
-        buf = [
-            "OS: {} {} {}".format(
-                info.system, info.release, info.version),
-            "Host: {}".format(
-                gethostname()),
-            "Uptime: {} days, {} hours, {} minutes".format(
-                uptime.days, uptime.hours, uptime.mins),
-            "and {} seconds".format(uptime.secs),
-            "Resolution: {}".format(get_screen_res()),
-            "Shell: PangShell v{}".format(ver),
-        ]
-
-        to_write = []
-
-        for ind, line in enumerate(logo):
-            if ind < len(buf):
-                line += buf[ind]
-            to_write.append(line)
+        # probing the system and building the gradient is only done
+        # again once the terminal, logo, version, host name or system
+        # (after an upgrade or reboot) changed
+        key = (get_console_width(), get_console_height(), logo,
+               os.stat(logo).st_mtime_ns, ver, gethostname(), system_id())
+        banner = self.script_cache.get_value(
+            "banner", key, lambda: render_banner(logo, ver))
 
-        to_write = gradient(to_write, (230, 45, 65), (55, 125, 235))
+        uptime = get_uptime()
 
-        stdout.write("\n" + "\n".join(to_write) + "\n")
+        stdout.write(banner
+            .replace(UPTIME_MARK, "{} days, {} hours, {} minutes".format(
+                uptime.days, uptime.hours, uptime.mins))
+            .replace(SECONDS_MARK, "{} seconds".format(uptime.secs)))
         stdout.flush()
-        del to_write
 
     def title(self) -> None:
         try:
@@ -609,22 +1408,32 @@ class Interpreter:
             stdout.flush()
 
     def cls(self) -> None:
-        IgnoreReturn(os.system("cls||clear"))
+        IgnoreReturn(os.system("cls" if platform == "win32" else "clear"))
 
-    def ls(self) -> None:
-        cur = self.ast[self.ind]
+    def expand_args(self, args: list[str],
+                    variables: list[str] | None) -> list[str]:
+        """ Replaces each {} placeholder with its variable's value. """
 
-        args = []
-        n = 0
+        return self.expand(args, substitution_plan(args, variables))
 
-        for arg in cur.expr:
-            if arg == "{}":
-                args.append(str(self.variables[cur.variables[n]]))
-                n += 1
-            else:
-                args.append(arg)
+    def expand(self, args: list[str], plan: tuple) -> list[str]:
+        """ Like expand_args with a plan made when the node was parsed.
+            Without placeholders args itself is returned. """
+
+        if not plan:
+            return args
+
+        args = args.copy()
+
+        for n, var in plan:
+            args[n] = str(self.variables[var])
+
+        return args
+
+    def ls(self) -> None:
+        cur = self.ast[self.ind]
+        args = self.expand(cur.expr, cur.plan)
 
-        del n
         extension = ""
         extension_st = False
         path = None
@@ -641,13 +1450,19 @@ class Interpreter:
             if arg:
                 path = arg
 
-        buf = "\n -- {} --\n\n".format(format_path(
-            os.path.abspath(path) if path else gcwd()))
-        buf += threaded_ls(extension, path)
+        stdout.write("\n -- {} --\n\n".format(format_path(
+            os.path.abspath(path) if path else gcwd())))
 
-        stdout.write(buf + "\n")
+        workers = self.variables.get("ls.workers")  # set with: set ls; workers = n; end
+
+        # stream the listing in chunks instead of building it all first
+        for chunk in ls_stream(extension, path,
+                               int(workers) if workers else None):
+            stdout.write(chunk)
+            stdout.flush()
+
+        stdout.write("\n")
         stdout.flush()
-        del buf
 
     def cd(self) -> None:
         new_dir = self.evaluate_expr()
@@ -665,140 +1480,856 @@ class Interpreter:
         open(self.evaluate_expr(), "x").close()
 
     def type_(self) -> None:
-        file = self.evaluate_expr()
+        cur = self.ast[self.ind]
+        args = iter(self.expand(cur.expr, cur.plan))
+
+        file = None
+        lines = None
+        tail = False
+
+        for arg in args:
+            if arg == "-n":
+                try:
+                    lines = int(next(args))
+                except (StopIteration, ValueError):
+                    raise SyntaxError("-n takes a number of lines.")
+            elif arg == "-h":
+                lines = 10 if lines is None else lines
+            elif arg == "-t":
+                lines = 10 if lines is None else lines
+                tail = True
+            elif arg:
+                if file is not None:
+                    raise SyntaxError("Cannot specify file more than once.")
+
+                file = arg
+
+        if file is None:
+            raise SyntaxError("No file to type.")
+
+        last = ""
 
         try:
-            print(open(file, "r", encoding="utf-8").read())
+            # constant memory, output starts with the first chunk
+            for chunk in type_stream(file, lines, tail):
+                if chunk:
+                    stdout.write(chunk)
+                    stdout.flush()
+                    last = chunk
         except FileNotFoundError:
             raise ValueError("File '{}' could not be found.".format(
                 file))
+        except IsADirectoryError:
+            raise ValueError("'{}' is a directory.".format(file))
 
-    def assign(self) -> None:
-        name = self.ast[self.ind].name
-        
-        if self.setting:
-            name = self.get_setting() + "." + name
-        
-        self.variables[name] = self.evaluate_expr()
+        if last and not last.endswith("\n"):
+            stdout.write("\n")
+            stdout.flush()
+
+    def exit_(self) -> None:
+        exit()
+
+    ## Instruction handlers, see _handlers. They return the index to ##
+    ## jump to, or None to go on with the next instruction.          ##
+
+    def with_sudo(self, function: Any, *args) -> None:
+        self.elevate()
+
+        try:
+            function(*args)
+        finally:
+            self.drop()
+
+    def run_keyword(self, cur: Keyword) -> None:
+        # builtins cannot be elevated by the helper, in a sudo statement
+        # or anywhere inside a sudo block
+        if (cur.sudo or self.elevated) and self.sudo_helper is not None:
+            raise ValueError("'{}' runs inside the shell, ".format(cur.name)
+                             + "only programs can run with sudo here.")
+
+        if cur.sudo:
+            self.with_sudo(cur.handler, self)
+        else:
+            cur.handler(self)
+
+    def assign(self, cur: Assign) -> None:
+        self.variables[self.scoped(cur.name)] = self.evaluate_expr(cur)
+
+    def run_program_node(self, cur: Program) -> None:
+        if self.blocks and (block := self.open_parallel()):
+            self.queue_program(block, cur)
+        elif cur.sudo:
+            self.with_sudo(self.run_program, self.expand(cur.args, cur.plan))
+        else:
+            self.run_program(self.expand(cur.args, cur.plan))
+
+    def run_pipeline(self, cur: Pipeline) -> None:
+        if cur.sudo:
+            self.with_sudo(self.pipeline)
+        else:
+            self.pipeline()
+
+    def run_background(self, cur: Background) -> None:
+        if cur.sudo:
+            self.with_sudo(self.background)
+        else:
+            self.background()
+
+    def jump(self, cur: Jump) -> int:
+        return cur.target
+
+    def branch(self, cur: Branch) -> int | None:
+        if not self.evaluate_expr(cur):
+            return cur.target
+
+        return None
+
+    def iterate(self, cur: ForInit) -> None:
+        items = self.evaluate_expr(cur)
+
+        if type(items) is str:
+            items = items.split()  # words, like a shell
+
+        self.iterators.append(iter(items))
+
+    def next_item(self, cur: ForNext) -> int | None:
+        """ Assigns the next item of the innermost for loop,
+            or leaves the loop once there is none. """
+
+        try:
+            item = next(self.iterators[-1])
+        except StopIteration:
+            self.iterators.pop()
+            return cur.target
+
+        self.variables[self.scoped(cur.name)] = item
+        return None
+
+    def pop_iterator(self, cur: ForPop) -> None:
+        self.iterators.pop()
+
+    def define(self, cur: FuncDef) -> None:
+        self.functions[cur.name] = cur
+
+    def return_(self, cur: Return) -> int:
+        return self.size
+
+    def raise_(self, cur: Raise) -> None:
+        raise cur.error
+
+    def is_function(self, node: Program) -> bool:
+        name = node.args[0]
+
+        if node.plan and node.plan[0][0] == 0:
+            name = str(self.variables[node.plan[0][1]])
+
+        return name in self.functions
+
+    def call(self, func: FuncDef, args: list[str]) -> None:
+        """ Runs a function with its parameters bound to args,
+            restoring the variables they shadowed afterwards. """
+
+        if len(args) != len(func.params):
+            raise ValueError("'{}' takes {} argument(s), {} given.".format(
+                func.name, len(func.params), len(args)))
+
+        shadowed = {param: self.variables.get(param, _MISSING)
+                    for param in func.params}
+
+        for param, arg in zip(func.params, args):
+            self.variables[param] = number(arg)
+
+        try:
+            self.run(func.code)
+        finally:
+            for param, value in shadowed.items():
+                if value is _MISSING:
+                    self.variables.pop(param, None)
+                else:
+                    self.variables[param] = value
         
+    def hash_(self) -> None:
+        cur = self.ast[self.ind]
+        args = [arg for arg in self.expand(cur.expr, cur.plan)
+                if arg]
+
+        if "-r" in args:
+            self.commands.clear()
+            return
+
+        for name in args:
+            if self.commands.resolve(name) is None:
+                raise ValueError(
+                    "'{}' is not an operable program or script.".format(name))
+
+        if args:
+            return
+
+        if not self.commands.hashed:
+            print("hash table empty")
+            return
+
+        print("hits    command")
+
+        for path, hits in self.commands.hashed.values():
+            print("{:>4}    {}".format(hits, format_path(path)))
+
+    def resident(self) -> None:
+        cur = self.ast[self.ind]
+        args = [arg for arg in self.expand(cur.expr, cur.plan)
+                if arg]
+
+        if not args:
+            for path in sorted(self.residents):
+                print(format_path(path))
+
+            return
+
+        remove = args[0] == "-r"
+
+        for name in args[remove:]:
+            path = self.commands.resolve(name) or os.path.abspath(name)
+
+            if remove:
+                self.residents.discard(path)
+                continue
+
+            if not os.path.isfile(path):
+                raise ValueError("File '{}' could not be found.".format(name))
+            if not path.endswith(".py"):
+                raise ValueError(
+                    "Only Python scripts can be resident, '{}' is not one."
+                    .format(name))
+
+            self.residents.add(path)
+
+        if self.residents:
+            self.workers.start()  # warm before the first run
+        else:
+            self.workers.close()
+
+    def resident_argv(self, args: list[str]) -> list[str] | None:
+        """ Returns the argv of the resident script args runs, either
+            directly or through python, or None. """
+
+        if args[0] in self.residents:
+            return args
+
+        name = os.path.splitext(os.path.basename(args[0]))[0].lower()
+
+        if len(args) > 1 and re.fullmatch(r"py|pythonw?[\d.]*", name):
+            script = os.path.abspath(args[1])
+
+            if script in self.residents:
+                return [script] + args[2:]
+
+        return None
+
+    def resolve_program(self, args: list[str]) -> list[str]:
+        """ Returns args with the command replaced by its full path. """
+
+        path = self.commands.resolve(args[0])
+
+        if path is None:
+            raise ValueError("'{}' is not an operable program or script.\n".format(args[0])
+                    + "Try typing the full name, the program must be compiled.")
+
+        return [path] + args[1:]
+
     def run_program(self, args: list[str]) -> None:
-        # check if .ps file exists
-        if os.path.isfile(args[0] + ".ps"):
-            run_file(self, args[0] + ".ps")
+        if args[0] in self.functions:
+            self.call(self.functions[args[0]], args[1:])
             return
 
-        if os.path.isfile(os.environ["WINDIR"] + "/" + args[0] + ".ps"):
-            run_file(self, os.environ["WINDIR"] + "/" + args[0] + ".ps")
+        args = self.resolve_program(args)
+
+        if args[0].endswith(".ps"):
+            run_file(self, args[0])
             return
-        extensions = ("", ".bat", ".exe", ".cmd", ".com")
 
-        for ext in extensions:
-            try:
-                run([args[0] + ext] + args[1:], stdout=stdout)
+        stdout.flush()  # keep output ordered, the program writes to the fd
+
+        if self.residents and not self.through_helper() \
+                and (argv := self.resident_argv(args)) is not None:
+            self.workers.run(argv[0], argv, stdout, stderr)
+        elif self.through_helper():
+            self.sudo_helper.run([args], 0, stdout.fileno(), 2)
+        else:
+            run(args, stdout=stdout)
+
+    def queue_program(self, block: ParallelBlock, node: Program) -> None:
+        """ Adds a program to a parallel block, its arguments are
+            expanded now so later assignments do not change them. """
+
+        command = self.expand(node.args, node.plan)
+
+        if command[0] not in self.functions:
+            command = self.resolve_program(command)
+
+        if command[0].endswith(".ps") or self.is_function(node):
+            raise ValueError(
+                "Scripts and functions cannot run in a parallel block.")
+
+        if self.through_helper():
+            raise ValueError("Parallel blocks cannot run with sudo here.")
+
+        block.add(command)
+
+    def run_stage(self, node: Keyword | Program) -> None:
+        """ Runs a single node outside of the current ast. """
+
+        self.run(Code([node]))
+
+    def redirect_path(self, redirect: Redirect) -> str:
+        return "".join(self.expand_args(redirect.target, redirect.variables))
+
+    def spawn(self, commands: list[list[str]], stdin: Any = None,
+              stdout_: Any = None, **kwargs) -> list[Popen]:
+        """ Starts commands with each one's stdout piped into the next.
+
+            A file descriptor passed as stdin is closed once the first
+            command has it, so the reader sees EOF when the writer ends. """
+
+        procs = []
+        prev = stdin
+
+        try:
+            for n, command in enumerate(commands):
+                last = n == len(commands) - 1
+
+                proc = Popen(command, stdin=prev,
+                             stdout=stdout_ if last else PIPE, **kwargs)
+
+                # drop the shell's copy so the reader sees EOF/broken pipe
+                if type(prev) is int and prev >= 0:  # not DEVNULL
+                    os.close(prev)
+                elif procs:
+                    procs[-1].stdout.close()
+
+                prev = proc.stdout
+                procs.append(proc)
+        except BaseException:
+            if type(prev) is int and prev >= 0:
+                os.close(prev)
+            elif procs:
+                procs[-1].stdout.close()
+
+            for proc in procs:
+                proc.wait()
+
+            raise
+
+        return procs
+
+    def pipeline_commands(self, stages: list[Keyword | Program]) \
+            -> list[list[str]]:
+        """ Resolves the programs of a pipeline, builtins are left out. """
+
+        commands = []
+
+        for stage in stages:
+            if type(stage) is not Program:
+                continue
+
+            if self.is_function(stage):
+                raise ValueError("Functions cannot read from a pipe.")
+
+            commands.append(self.resolve_program(
+                self.expand(stage.args, stage.plan)))
+
+        return commands
+
+    def open_redirects(self, node: Pipeline, text: bool = False) -> tuple:
+        """ Opens the files a pipeline reads from and writes to. """
+
+        stdin_file = None
+        stdout_file = None
+
+        try:
+            if node.stdin is not None:
+                stdin_file = open(self.redirect_path(node.stdin), "rb")
+
+            if node.stdout is not None:
+                mode = "a" if node.stdout.append else "w"
+
+                if text:
+                    stdout_file = open(self.redirect_path(node.stdout),
+                                       mode, encoding="utf-8")
+                else:
+                    stdout_file = open(self.redirect_path(node.stdout),
+                                       mode + "b")
+        except BaseException:
+            if stdin_file is not None:
+                stdin_file.close()
+
+            raise
+
+        return stdin_file, stdout_file
+
+    def pipeline(self) -> None:
+        """ Runs the stages of a pipeline concurrently.
+
+            Programs are connected with OS pipes, so data never passes
+            through the shell. A builtin (or script) can only be the first
+            stage, it runs in the shell with stdout swapped for the write
+            end of a pipe while the programs after it read from it. """
+
+        global stdout
+
+        cur = self.ast[self.ind]
+        first = cur.stages[0]
+        producer = None
+
+        if type(first) is Keyword or self.is_function(first):
+            producer = first
+
+        # resolve every program before starting any of them
+        commands = self.pipeline_commands(
+            cur.stages[1:] if producer is not None else cur.stages)
+
+        if producer is None and commands[0][0].endswith(".ps"):
+            producer = first
+            del commands[0]
+
+        for command in commands:
+            if command[0].endswith(".ps"):
+                raise ValueError("Script '{}' cannot read from a pipe.".format(
+                    format_path(command[0])))
+
+        if producer is not None and cur.stdin is not None:
+            raise ValueError("Scripts cannot read from a file.")
+
+        if producer is not None and self.through_helper():
+            raise ValueError("Only programs can be piped with sudo here.")
+
+        stdin_file, stdout_file = self.open_redirects(cur, not commands)
+        write_end = None
+        procs = []
+
+        try:
+            prev = stdin_file
+
+            if producer is not None and commands:
+                prev, write_end = os.pipe()
+
+            stdout.flush()
+
+            if commands and self.through_helper():
+                self.sudo_helper.run(
+                    commands, prev.fileno() if prev is not None else 0,
+                    (stdout_file or stdout).fileno(), 2)
+            elif commands:
+                procs = self.spawn(commands, prev, stdout_file or stdout)
+
+            if producer is None:
                 return
-            except Exception:
-                pass  # wait until end to catch all exceptions
 
-        # check system32
-        for ext in extensions:
+            if write_end is not None:
+                out = os.fdopen(write_end, "w", encoding="utf-8")
+                write_end = None
+            else:
+                out = stdout_file
+
+            saved = stdout
+            stdout = out
+
             try:
-                run([
-                    os.environ["WINDIR"] + "/" + args[0] + ext
-                ] + args[1:],
-                    stdout=stdout
-                )
-                return
-            except Exception:
-                pass  # wait until end to catch all exceptions
+                self.run_stage(producer)
+                out.flush()
+            except BrokenPipeError:
+                pass  # the reader exited before reading everything
+            finally:
+                stdout = saved
+
+                if out is not stdout_file:
+                    try:
+                        out.close()
+                    except BrokenPipeError:
+                        pass
+        finally:
+            if write_end is not None:
+                os.close(write_end)
+
+            for proc in procs:
+                proc.wait()
+
+            if stdin_file is not None:
+                stdin_file.close()
+            if stdout_file is not None:
+                stdout_file.close()
+
+    def background(self) -> None:
+        """ Starts a program or pipeline as a job and returns at once. """
+
+        if self.through_helper():
+            raise ValueError("Background jobs cannot run with sudo here.")
+
+        node = self.ast[self.ind].node
+        stages = node.stages if type(node) is Pipeline else [node]
+
+        if self.is_function(stages[0]):
+            raise ValueError(
+                "Only programs and pipelines can run in the background.")
+
+        commands = self.pipeline_commands(stages)
+
+        for command in commands:
+            if command[0].endswith(".ps"):
+                raise ValueError(
+                    "Only programs and pipelines can run in the background.")
+
+        if type(node) is Pipeline:
+            stdin_file, stdout_file = self.open_redirects(node)
+        else:
+            stdin_file = stdout_file = None
+
+        stdout.flush()
+
+        try:
+            # background jobs never read from the console
+            procs = self.spawn(commands, stdin_file or DEVNULL,
+                               stdout_file or stdout, **DETACHED)
+        finally:
+            # the programs hold their own copies
+            if stdin_file is not None:
+                stdin_file.close()
+            if stdout_file is not None:
+                stdout_file.close()
+
+        job = self.jobs.add(" | ".join(list2cmdline(command)
+                                       for command in commands), procs)
+
+        print("[{}] {}".format(job.id, procs[-1].pid))
+
+    def jobs_(self) -> None:
+        for job in self.jobs:
+            print(job)
+
+    def job_args(self) -> list[str]:
+        cur = self.ast[self.ind]
 
-        raise ValueError("'{}' is not an operable program or script.\n".format(args[0])
-                + "Try typing the full name, the program must be compiled.")
+        return [arg for arg in self.expand(cur.expr, cur.plan)
+                if arg]
+
+    def wait(self) -> None:
+        args = self.job_args()
+        jobs = [self.jobs.get(arg) for arg in args] if args else list(self.jobs)
+
+        for job in jobs:
+            job.wait()
+            self.jobs.remove(job)
+            print(job)
+
+    def fg(self) -> None:
+        args = self.job_args()
+
+        if len(args) > 1:
+            raise SyntaxError("fg takes at most one job.")
+
+        job = self.jobs.get(args[0] if args else None)
+        print(job.command)
+
+        try:
+            job.wait()
+        except KeyboardInterrupt:
+            job.interrupt()  # it is in its own group, pass ctrl + c on
+            job.wait()
+
+        self.jobs.remove(job)
 
     def set_builtins(self) -> None:
-        self.variables["builtin.main.dir"]  = MAIN_DIR
-        self.variables["builtin.variables"] = ",\n".join(self.variables) + "\n"
+        self.variables["builtin.main.dir"] = MAIN_DIR
+        self.variables.add_listing("builtin.variables")  # built lazily on read
+
+    def recover(self, code: Code) -> int:
+        """ Returns where to continue after the instruction at self.ind
+            failed: past the block for a failed condition or sudo, else
+            the start of the next line. """
+
+        cur = code.instructions[self.ind]
+
+        if type(cur) in (Branch, ForInit, Elevate):
+            return cur.target
+
+        line = code.lines[self.ind]
+        ind = self.ind
+
+        while ind < len(code.lines) and code.lines[ind] == line:
+            ind += 1
+
+        return ind
+
+    def run(self, code: Code) -> None:
+        saved_ast, saved_size, saved_ind = self.ast, self.size, self.ind
+        depth = len(self.iterators)
+        elevated = self.elevated
 
-    def run(self, ast: list[ASTNode]) -> None:
-        self.ast = ast
+        ast = self.ast = code.instructions
         self.size = len(ast)
         self.ind = 0
 
-        while self.ind < self.size:
-            self.set_builtins()
-            cur = ast[self.ind]
-
-            if type(cur) is Keyword:
-                self.sudo(True)
-                self.keyword_function[cur.name]()
-                self.sudo(False)
-            elif type(cur) is Assign:
-                self.assign()
-            elif type(cur) is Program:
-                self.sudo(True)
-                args = []
-                n = 0
-
-                for arg in cur.args:
-                    if arg == "{}":
-                        args.append(str(self.variables[cur.variables[n]]))
-                        n += 1
-                    else:
-                        args.append(arg)
-
-                self.run_program(args)
-                self.sudo(False)
+        handlers = _handlers
 
-            self.ind += 1
+        try:
+            while (ind := self.ind) < self.size:
+                cur = ast[ind]
+
+                try:
+                    target = handlers[type(cur)](self, cur)
+                except Exception as error:
+                    if code.lines is None:
+                        raise
+
+                    report_error(error)
+                    self.ind = self.recover(code)
+                    continue
+
+                self.ind = ind + 1 if target is None else target
+        finally:
+            del self.iterators[depth:]
+
+            while self.elevated > elevated:  # left by return or an error
+                self.drop()
+            self.ast, self.size, self.ind = saved_ast, saved_size, saved_ind
+
+
+# instruction type -> handler
+_handlers = {
+    Keyword: Interpreter.run_keyword,
+    Assign: Interpreter.assign,
+    Program: Interpreter.run_program_node,
+    Pipeline: Interpreter.run_pipeline,
+    Background: Interpreter.run_background,
+    Jump: Interpreter.jump,
+    Branch: Interpreter.branch,
+    ForInit: Interpreter.iterate,
+    ForNext: Interpreter.next_item,
+    ForPop: Interpreter.pop_iterator,
+    FuncDef: Interpreter.define,
+    Return: Interpreter.return_,
+    Raise: Interpreter.raise_,
+    Elevate: Interpreter.elevate,
+    Drop: Interpreter.drop,
+}
+
+# keyword -> handler, stored in Keyword nodes when they are parsed
+_keyword_handlers = {
+    "rl": Interpreter.reload,
+    "cd": Interpreter.cd,
+    "ls": Interpreter.ls,
+    "rm": Interpreter.rm,
+    "del": Interpreter.del_var,
+    "hash": Interpreter.hash_,
+    "resident": Interpreter.resident,
+    "jobs": Interpreter.jobs_,
+    "wait": Interpreter.wait,
+    "fg": Interpreter.fg,
+    "set": Interpreter.set,
+    "parallel": Interpreter.parallel,
+    "end": Interpreter.fin,
+    "cls": Interpreter.cls,
+    "echo": Interpreter.echo,
+    "type": Interpreter.type_,
+    "touch": Interpreter.touch,
+    "title": Interpreter.title,
+    "uptime": Interpreter.uptime,
+    "neofetch": Interpreter.neofetch,
+
+    "exit": Interpreter.exit_,
+    "@echo": Interpreter.echo_toggle,
+}
+
+
+def number(arg: str) -> int | float | str:
+    """ Returns arg as a number if it is one, like the lexer reads it. """
+
+    try:
+        return int(arg)
+    except ValueError:
+        pass
+
+    try:
+        return float(arg)
+    except ValueError:
+        return arg
+
+
+def report_error(error: Exception) -> None:
+    if type(error) is KeyError:
+        print(rgb("Variable {} does not exist.".format(error), RED))
+    else:
+        print(rgb(error, RED))
+
+
+def compile_lines(lines: list[str]) -> Code:
+    """ Parses and compiles every line of a script. Errors are kept as
+        Raise instructions so they are reported when the line is reached,
+        like before caching, and the rest of the script still runs. """
+
+    compiler = Compiler(recover=True)
+
+    for n, line in enumerate(lines, 1):
+        try:
+            p = Parser(FastLexer(line))
+            p.parse()
+            compiler.feed(p.ast, n)
+        except Exception as error:
+            compiler.feed(error, n)
+
+    return compiler.finish()
 
 
 def run_file(i: Interpreter, file: str) -> None:
-    saved_ind = i.ind
+    i.run(i.script_cache.get(file, compile_lines))
+
+
+# state handed to the new process by rl, header is magic + format version
+STATE_MAGIC = b"PANGSTATE\x04"
+
+
+def save_state(i: Interpreter) -> str:
+    """ Pickles the interpreter's state into a temporary file
+        and returns its path. """
+
+    from tempfile import mkstemp  # only needed to reload
+
+    fd, path = mkstemp(prefix="pangshell-", suffix=".state")
+
+    with os.fdopen(fd, "wb") as fp:
+        fp.write(STATE_MAGIC)
+        pickle.dump({
+            "variables": i.variables,
+            "setting": i.setting,
+            "blocks": i.blocks,
+            "functions": i.functions,
+            "scripts": i.script_cache.scripts,
+            "commands": i.commands,
+            "residents": i.residents,
+        }, fp, pickle.HIGHEST_PROTOCOL)
+
+    return path
+
+
+def load_state(path: str) -> dict:
+    """ Reads and removes a state file written by save_state. Any other
+        file is left alone. """
+
+    from tempfile import gettempdir
+
+    name = os.path.basename(path)
+
+    if os.path.dirname(os.path.abspath(path)) != os.path.abspath(gettempdir()) \
+            or not (name.startswith("pangshell-") and name.endswith(".state")):
+        raise ValueError("'{}' is not a state file.".format(path))
+
+    with open(path, "rb") as fp:
+        if fp.read(len(STATE_MAGIC)) != STATE_MAGIC:
+            raise ValueError("State file is from another version.")
 
-    for line in open(file, "r", encoding="utf-8").readlines():
         try:
-            l = Lexer(line.replace("\n", ""))
-            p = Parser(l)
-            p.parse()
-            i.run(p.ast)
-        except KeyError as var_name:
-            print(rgb("Variable {} does not exist.".format(var_name), RED))
-        except Exception as error:
-            print(rgb(error, RED))
+            return pickle.load(fp)
+        finally:
+            os.remove(path)
 
-    i.ind = saved_ind
+
+def print_profile(phases: list[tuple[str, float]]) -> None:
+    """ Prints how long each startup phase took, phases holds
+        each one's name and when it ended. """
+
+    prev = STARTED
+
+    for name, end in phases:
+        print("{:<14}{:>8.1f} ms".format(name, (end - prev) * 1000))
+        prev = end
+
+    print(rgb("{:<14}{:>8.1f} ms".format("first prompt",
+                                         (prev - STARTED) * 1000), GREEN))
 
 
 if __name__ == "__main__":
-    sigint_paused = True
-    
+    pause_sigint(True)
+    phases = [("imports", perf_counter())]
+    profile = "--startup-profile" in argv
+
+    if profile:
+        argv.remove("--startup-profile")
+
     i = Interpreter()
+    phases.append(("interpreter", perf_counter()))
+    state = None
+
+    if "--state" in argv:
+        state_index = argv.index("--state")
+
+        try:
+            state = load_state(argv[state_index + 1])
+        except Exception as error:
+            print(rgb("Could not restore state: {}".format(error), RED))
+
+        del argv[state_index + 1], argv[state_index]
+
+    if state is not None:
+        # reuse the parent's caches before running anything
+        i.script_cache.scripts = state["scripts"]
+        i.commands = state["commands"]
     
     run_file(i, os.path.join(MAIN_DIR, "startup.ps"))
+    phases.append(("startup.ps", perf_counter()))
     
     VERSION = i.variables["info.ver"]
 
-    if "--vars" in argv:
-        variables_index = argv.index("--vars")
-        i.variables = eval(argv[variables_index + 1])
-        del argv[variables_index + 1], argv[variables_index]
+    if state is not None:
+        i.variables = state["variables"]
+        i.setting = state["setting"]
+        i.blocks = state["blocks"]
+        i.functions = state["functions"]
+        i.residents = state["residents"]
+
+        if i.residents:
+            i.workers.start()
+
+    scanner = Scanner(
+        History(os.path.join(MAIN_DIR, "history")),
+        Completer(keywords, lambda: i.variables, i.commands)
+    )
 
-    scanner = Scanner()
+    compiler = Compiler()
+    phases.append(("prompt setup", perf_counter()))
+
+    if profile:
+        print_profile(phases)
 
     while True:
-        stdout.write(rgb("{}".format(gcwd()), PURPLE) + rgb("$ ", GREEN))
+        if not compiler.is_open():
+            for job in i.jobs.finished():
+                print(job)  # report jobs that finished since the last prompt
+
+        stdout.write(prompt(compiler.is_open()))
         stdout.flush()
 
         try:
             scanner.scan()
-            l = Lexer(scanner.inp)
+            l = FastLexer(scanner.inp)
             p = Parser(l)
             p.parse()
-            sigint_paused = False
-            i.run(p.ast)
-            sigint_paused = True
-        except KeyError as var_name:
-            print(rgb("Variable {} does not exist.".format(var_name), RED))
+            compiler.feed(p.ast)
+
+            if compiler.is_open():
+                continue  # read the rest of the block first
+
+            code = compiler.finish()
+            compiler = Compiler()
+
+            pause_sigint(False)
+
+            try:
+                i.run(code)
+            finally:
+                pause_sigint(True)
+        except EOFError:
+            break  # input was closed
         except Exception as error:
-            print(rgb(error, RED))
+            compiler = Compiler()
+            report_error(error)
         except KeyboardInterrupt:
-            pass
+            compiler = Compiler()
@@ -0,0 +1,254 @@
+""" privilege elevation for sudo
+
+    On Windows the privileges of the shell's own token are enabled,
+    all of them with a single AdjustTokenPrivileges call, and child
+    processes inherit them. Elsewhere the shell cannot elevate itself,
+    so programs run with sudo are started by a root helper process that
+    is authenticated (through sudo or doas) once per session. """
+
+import os
+import json
+import shutil
+import socket
+import ctypes
+from subprocess import Popen
+from sys import executable
+
+WINDOWS = os.name == "nt"
+
+# Windows
+TOKEN_ADJUST_PRIVILEGES = 0x20
+TOKEN_QUERY = 0x8
+TOKEN_PRIVILEGES_CLASS = 3  # TokenPrivileges in TOKEN_INFORMATION_CLASS
+SE_PRIVILEGE_ENABLED = 0x2
+
+
+class LUID_AND_ATTRIBUTES(ctypes.Structure):
+    _fields_ = [
+        ("LowPart", ctypes.c_uint32),
+        ("HighPart", ctypes.c_int32),
+        ("Attributes", ctypes.c_uint32),
+    ]
+
+
+def token_privileges(count: int) -> type:
+    """ TOKEN_PRIVILEGES with room for count privileges. """
+
+    class TOKEN_PRIVILEGES(ctypes.Structure):
+        _fields_ = [
+            ("PrivilegeCount", ctypes.c_uint32),
+            ("Privileges", LUID_AND_ATTRIBUTES * count),
+        ]
+
+    return TOKEN_PRIVILEGES
+
+
+class TokenPrivileges:
+    """ Enables every privilege the shell's token holds.
+
+        The token and the privileges it holds are looked up once, then
+        enabling is one AdjustTokenPrivileges call and disabling another
+        that restores the previous state. Calls nest, only the outermost
+        enable and disable touch the token. """
+
+    def __init__(self) -> None:
+        self.depth = 0
+        self.token = None
+        self.enabled = None
+        self.previous = None
+
+    def _open(self) -> None:
+        advapi32 = ctypes.windll.advapi32
+        kernel32 = ctypes.windll.kernel32
+
+        token = ctypes.c_void_p()
+
+        if not advapi32.OpenProcessToken(
+                ctypes.c_void_p(kernel32.GetCurrentProcess()),
+                TOKEN_ADJUST_PRIVILEGES | TOKEN_QUERY, ctypes.byref(token)):
+            raise ctypes.WinError()
+
+        size = ctypes.c_uint32()
+        advapi32.GetTokenInformation(token, TOKEN_PRIVILEGES_CLASS, None, 0,
+                                     ctypes.byref(size))
+        buffer = ctypes.create_string_buffer(size.value)
+
+        if not advapi32.GetTokenInformation(token, TOKEN_PRIVILEGES_CLASS,
+                                            buffer, size, ctypes.byref(size)):
+            raise ctypes.WinError()
+
+        count = ctypes.c_uint32.from_buffer(buffer).value
+        struct = token_privileges(count)
+
+        self.enabled = struct.from_buffer_copy(buffer[:ctypes.sizeof(struct)])
+        self.previous = struct()
+        self.token = token
+
+        for n in range(count):
+            self.enabled.Privileges[n].Attributes = SE_PRIVILEGE_ENABLED
+
+    def enable(self) -> None:
+        if self.depth > 0:
+            self.depth += 1
+            return
+
+        if self.token is None:
+            self._open()
+
+        size = ctypes.c_uint32()
+
+        if not ctypes.windll.advapi32.AdjustTokenPrivileges(
+                self.token, False, ctypes.byref(self.enabled),
+                ctypes.sizeof(self.previous), ctypes.byref(self.previous),
+                ctypes.byref(size)):
+            raise ctypes.WinError()
+
+        self.depth = 1  # only once the token was changed
+
+    def disable(self) -> None:
+        self.depth -= 1
+
+        if self.depth > 0:
+            return
+
+        if not ctypes.windll.advapi32.AdjustTokenPrivileges(
+                self.token, False, ctypes.byref(self.previous), 0, None, None):
+            raise ctypes.WinError()
+
+
+# POSIX
+
+# Runs as root, started through sudo or doas. Every request is one packet
+# of json with the stdin, stdout and stderr to use attached, the reply
+# holds the exit status of every command or an error.
+HELPER = r"""
+import json, os, signal, socket, subprocess, sys
+
+procs = []
+
+
+def interrupt(*_):
+    # pass ctrl + c on, the handler is reset to the default on exec
+    for proc in procs:
+        proc.send_signal(signal.SIGINT)
+
+
+signal.signal(signal.SIGINT, interrupt)
+
+sock = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+sock.connect(sys.argv[1])
+
+while True:
+    data, fds, _, _ = socket.recv_fds(sock, 1 << 20, 3)
+
+    if not data:
+        break
+
+    request = json.loads(data)
+    procs = []
+
+    try:
+        prev = fds[0]
+
+        for n, command in enumerate(request["commands"]):
+            last = n == len(request["commands"]) - 1
+            proc = subprocess.Popen(
+                command, cwd=request["cwd"], stdin=prev,
+                stdout=fds[1] if last else subprocess.PIPE, stderr=fds[2])
+
+            if procs:
+                procs[-1].stdout.close()
+
+            prev = proc.stdout
+            procs.append(proc)
+
+        reply = {"statuses": [proc.wait() for proc in procs]}
+    except OSError as error:
+        for proc in procs:
+            proc.kill()
+            proc.wait()
+
+        reply = {"error": str(error)}
+    finally:
+        for fd in fds:
+            os.close(fd)
+
+    sock.send(json.dumps(reply).encode())
+"""
+
+
+class SudoHelper:
+    """ A root process that runs commands for the shell.
+
+        It is started the first time it is needed, which is when sudo
+        (or doas) asks for the password, and then kept for the session,
+        so later sudo commands need no new authentication or process.
+        It exits when the shell does, as its socket is closed. """
+
+    def __init__(self) -> None:
+        self.proc = None
+        self.sock = None
+
+    def start(self) -> None:
+        from tempfile import mkdtemp  # only needed once per session
+
+        tool = shutil.which("sudo") or shutil.which("doas")
+
+        if tool is None:
+            raise PermissionError("Neither sudo nor doas could be found.")
+
+        directory = mkdtemp(prefix="pangshell-sudo-")  # only we can enter
+        path = os.path.join(directory, "helper")
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+
+        try:
+            server.bind(path)
+            server.listen(1)
+            server.settimeout(0.2)
+
+            self.proc = Popen([tool, executable, "-c", HELPER, path])
+
+            while self.sock is None:
+                try:
+                    self.sock, _ = server.accept()
+                except socket.timeout:
+                    if self.proc.poll() is not None:
+                        self.proc = None
+                        raise PermissionError("Could not elevate.")
+        finally:
+            server.close()
+            os.remove(path)
+            os.rmdir(directory)
+
+        self.sock.settimeout(None)
+
+    def run(self, commands: list[list[str]], stdin: int, stdout: int,
+            stderr: int) -> list[int]:
+        """ Runs commands as root, piped into each other, and returns
+            their exit statuses. """
+
+        if self.sock is None or self.proc.poll() is not None:
+            self.sock = None
+            self.start()
+
+        request = json.dumps({"commands": commands, "cwd": os.getcwd()})
+        socket.send_fds(self.sock, [request.encode()], [stdin, stdout, stderr])
+
+        interrupted = False
+
+        while True:
+            try:
+                reply = json.loads(self.sock.recv(1 << 20))
+                break
+            except KeyboardInterrupt:
+                # the commands got ctrl + c as well, keep the replies in
+                # step by waiting for this one before passing it on
+                interrupted = True
+
+        if interrupted:
+            raise KeyboardInterrupt
+
+        if "error" in reply:
+            raise OSError(reply["error"])
+
+        return reply["statuses"]
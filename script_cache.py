@@ -0,0 +1,126 @@
+""" compiled script cache """
+
+import os
+import pickle
+from hashlib import sha1
+from typing import Any, Callable
+
+# bump whenever the layout of cached ASTs changes so stale files are ignored
+MAGIC = b"PSC\x00\x08"
+
+
+class ScriptCache:
+    """ Keeps parsed scripts in memory, keyed by path, mtime and size.
+
+        If cache_dir is given, compiled scripts are also written there
+        (similar to __pycache__) so they survive between sessions.
+        Other values that are slow to build (e.g. neofetch's banner)
+        are kept the same way under a name, see get_value. """
+
+    def __init__(self, cache_dir: str | None = None) -> None:
+        self.cache_dir = cache_dir
+        self.scripts: dict[str, tuple[int, int, Any]] = {}
+        self.values: dict[str, tuple[Any, Any]] = {}
+
+    def _cache_file(self, path: str) -> str:
+        name = os.path.basename(path)
+        digest = sha1(path.encode("utf-8", "surrogatepass")).hexdigest()[:16]
+
+        return os.path.join(self.cache_dir, "{}.{}.psc".format(name, digest))
+
+    def _load(self, path: str, mtime: int, size: int) -> Any:
+        try:
+            with open(self._cache_file(path), "rb") as fp:
+                if fp.read(len(MAGIC)) != MAGIC:
+                    return None
+
+                cached_mtime, cached_size, compiled = pickle.load(fp)
+        except Exception:
+            return None  # missing or unreadable cache is just a miss
+
+        if (cached_mtime, cached_size) != (mtime, size):
+            return None
+
+        return compiled
+
+    def _dump(self, path: str, mtime: int, size: int, compiled: Any) -> None:
+        self._write(self._cache_file(path), (mtime, size, compiled))
+
+    def _write(self, file: str, entry: tuple) -> None:
+        tmp = file + ".tmp"
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+            with open(tmp, "wb") as fp:
+                fp.write(MAGIC)
+                pickle.dump(entry, fp, pickle.HIGHEST_PROTOCOL)
+
+            os.replace(tmp, file)
+        except Exception:
+            # persisting is best effort, the memory cache still works
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+    def get(self, path: str, compile_: Callable[[list[str]], Any]) -> Any:
+        """ Returns the compiled form of path, compiling it if needed. """
+
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        mtime, size = st.st_mtime_ns, st.st_size
+
+        entry = self.scripts.get(path)
+
+        if entry is not None and entry[:2] == (mtime, size):
+            return entry[2]
+
+        compiled = None
+
+        if self.cache_dir is not None:
+            compiled = self._load(path, mtime, size)
+
+        if compiled is None:
+            with open(path, "r", encoding="utf-8") as fp:
+                compiled = compile_([line.replace("\n", "")
+                                     for line in fp.readlines()])
+
+            if self.cache_dir is not None:
+                self._dump(path, mtime, size, compiled)
+
+        self.scripts[path] = (mtime, size, compiled)
+        return compiled
+
+    def get_value(self, name: str, key: Any, make: Callable[[], Any]) -> Any:
+        """ Returns the value stored as name if it was made for key,
+            else makes, stores and returns a new one. """
+
+        entry = self.values.get(name)
+
+        if entry is not None and entry[0] == key:
+            return entry[1]
+
+        entry = None
+
+        if self.cache_dir is not None:
+            file = os.path.join(self.cache_dir, name + ".psv")
+
+            try:
+                with open(file, "rb") as fp:
+                    if fp.read(len(MAGIC)) == MAGIC:
+                        entry = pickle.load(fp)
+            except Exception:
+                pass  # a miss
+
+        if entry is None or entry[0] != key:
+            entry = (key, make())
+
+            if self.cache_dir is not None:
+                self._write(file, entry)
+
+        self.values[name] = entry
+        return entry[1]
+
+    def clear(self) -> None:
+        self.scripts.clear()
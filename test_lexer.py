@@ -0,0 +1,77 @@
+""" differential test: FastLexer must give the same tokens (or the same
+    error) as the reference Lexer
+
+    Runs under pytest, or directly: python test_lexer.py [lines] """
+
+import random
+
+from pangshell import Lexer, FastLexer
+from helpers import keywords
+
+# edge cases every lexer change has touched so far
+EDGE_CASES = [
+    "", " ", "\t", "echo", "echo hi", "echo \"hi there\"", "echo \"",
+    "x = 1", "x += 1.5", "x **= 2", "x==1", "a != b", "a !b", "!",
+    "a <= b", "a >= b", "a < b", "a > b", "a >> b", "a>>=b",
+    "ls | type -n 3 > out.txt", "prog < in.txt >> log", "nap 1 &",
+    "sudo rm -r $dir", "$a.b.c", "$", "@echo off", "1.", "1.2.3",
+    "-3", "a-b", "x=-1", "f(1, 2)", "if $i < 10; echo $i", "for i in range(3)",
+    "func f a b", "\"unterminated", "a ~ b", "a # b", "a\\b", "é",
+    "end;end", "x = \"a\" + \"b\"", "**", "***", "*=*", "%=", "//",
+]
+
+# weighted towards characters with meaning to the lexers
+ALPHABET = (" \t\"$.@/_=+-*/%<>!();|&0123456789" + "abcxyzIF" * 2
+            + "~#\\é")
+WORDS = keywords + ["sudo", "$x", "1.5", "\"s\"", "**=", ">>", "!="]
+
+
+def lex(lexer: type, line: str) -> list | tuple:
+    try:
+        tokens = lexer(line)
+        tokens.lex()
+    except Exception as error:
+        return type(error), str(error)
+
+    return [(tok.type_, tok.value) for tok in tokens.toks]
+
+
+def random_line(rng: random.Random) -> str:
+    parts = []
+
+    for _ in range(rng.randint(0, 8)):
+        if rng.random() < 0.3:
+            parts.append(rng.choice(WORDS))
+        else:
+            parts.append("".join(rng.choice(ALPHABET)
+                                 for _ in range(rng.randint(1, 6))))
+
+    return rng.choice(("", " ", "")).join(parts)
+
+
+def check(line: str) -> None:
+    expected = lex(Lexer, line)
+    got = lex(FastLexer, line)
+
+    assert got == expected, "{!r}:\n  Lexer:     {}\n  FastLexer: {}".format(
+        line, expected, got)
+
+
+def test_edge_cases() -> None:
+    for line in EDGE_CASES:
+        check(line)
+
+
+def test_random_lines(count: int = 20000) -> None:
+    rng = random.Random(0)  # reproducible failures
+
+    for _ in range(count):
+        check(random_line(rng))
+
+
+if __name__ == "__main__":
+    from sys import argv
+
+    test_edge_cases()
+    test_random_lines(int(argv[1]) if len(argv) > 1 else 20000)
+    print("lexers agree")
@@ -0,0 +1,176 @@
+""" interpreter variable store """
+
+from collections.abc import MutableMapping
+from typing import Any, Iterator
+
+
+class Variables(MutableMapping):
+    """ Dict-like variable store.
+
+        Values live in a flat dict keyed by the full dotted name, which is
+        what {} substitution reads. Alongside it, dotted names are indexed
+        in a namespace tree (nested dicts, one level per segment), so a
+        whole namespace can be listed or deleted without a scan of every
+        variable.
+
+        The listing key (builtin.variables) is not stored as a string,
+        it is rebuilt only when read after a variable was added or removed.
+        version is bumped on every such change so caches built from the
+        variable names (e.g. completion) know when to rebuild. """
+
+    def __init__(self, *args, **kwargs) -> None:
+        self._vars: dict[str, Any] = dict(*args, **kwargs)
+        self._tree: dict[str, dict] = {}
+        self._listing_key = None
+        self._listing = None
+        self.version = 0
+
+        for key in self._vars:
+            self._tree_add(key)
+
+    def _tree_add(self, key: str) -> None:
+        node = self._tree
+
+        for part in key.split("."):
+            node = node.setdefault(part, {})
+
+    def _tree_node(self, key: str) -> dict | None:
+        node = self._tree
+
+        for part in key.split("."):
+            node = node.get(part)
+
+            if node is None:
+                return None
+
+        return node
+
+    def _tree_remove(self, key: str) -> None:
+        """ Drops key from the tree, pruning namespaces left empty. """
+
+        parts = key.split(".")
+        path = [self._tree]
+
+        for part in parts:
+            node = path[-1].get(part)
+
+            if node is None:
+                return
+
+            path.append(node)
+
+        for n in range(len(parts), 0, -1):
+            name = ".".join(parts[:n])
+
+            if path[n] or name in self._vars:
+                break  # still a namespace or a variable
+
+            del path[n - 1][parts[n - 1]]
+
+    def namespace(self, prefix: str) -> list[str]:
+        """ Returns the full names directly inside namespace prefix. """
+
+        node = self._tree_node(prefix)
+
+        if node is None:
+            return []
+
+        return ["{}.{}".format(prefix, name) for name in node]
+
+    def subtree(self, prefix: str) -> list[str]:
+        """ Returns every variable inside namespace prefix, at any depth. """
+
+        node = self._tree_node(prefix)
+
+        if node is None:
+            return []
+
+        res = []
+        stack = [(prefix, node)]
+
+        while stack:
+            name, node = stack.pop()
+
+            for part, child in reversed(node.items()):
+                full = "{}.{}".format(name, part)
+                stack.append((full, child))
+
+            if name != prefix and name in self._vars:
+                res.append(name)
+
+        return res
+
+    def delete_tree(self, prefix: str) -> list[str]:
+        """ Deletes every variable inside namespace prefix (not prefix
+            itself) and returns their names. """
+
+        deleted = self.subtree(prefix)
+
+        if not deleted:
+            return deleted
+
+        for key in deleted:
+            del self._vars[key]
+
+        self._tree_node(prefix).clear()
+        self._tree_remove(prefix)
+
+        self._listing = None
+        self.version += 1
+
+        if self._listing_key in deleted:
+            self._listing_key = None
+
+        return deleted
+
+    def add_listing(self, key: str) -> None:
+        """ Makes key hold a ",\\n" separated list of every variable. """
+
+        if key not in self._vars:
+            self._vars[key] = None
+            self._tree_add(key)
+            self._listing = None
+            self.version += 1
+
+        self._listing_key = key
+
+    def listing(self) -> str:
+        if self._listing is None:
+            self._listing = ",\n".join(self._vars) + "\n"
+
+        return self._listing
+
+    def __getitem__(self, key: str) -> Any:
+        if key == self._listing_key:
+            return self.listing()
+
+        return self._vars[key]
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key not in self._vars:
+            self._tree_add(key)
+            self._listing = None
+            self.version += 1
+
+        self._vars[key] = value
+
+    def __delitem__(self, key: str) -> None:
+        del self._vars[key]
+        self._tree_remove(key)
+        self._listing = None
+        self.version += 1
+
+        if key == self._listing_key:
+            self._listing_key = None
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._vars
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._vars)
+
+    def __len__(self) -> int:
+        return len(self._vars)
+
+    def __repr__(self) -> str:
+        return repr(dict(self.items()))
@@ -0,0 +1,175 @@
+""" warm Python workers for resident scripts
+
+    A resident script is run by a Python process that was started ahead
+    of time and stays alive between runs, so neither interpreter startup
+    nor the imports the script already did are paid again. The script
+    must be safe to run several times in one process. """
+
+import os
+import json
+import struct
+import codecs
+from subprocess import Popen, PIPE
+from sys import executable
+from typing import TextIO
+
+from jobs import DETACHED
+
+WORKERS = 2  # started ahead of time, once the first script is resident
+
+# Reads one json request per line and answers with frames: a kind
+# (o for stdout, e for stderr, x for the exit status), the length of
+# the data and the data.
+WORKER = r"""
+import io, os, sys, json, runpy, struct, traceback
+
+frames = os.fdopen(os.dup(1), "wb", buffering=0)
+os.dup2(2, 1)  # programs the script starts must not write into frames
+
+
+class FrameWriter(io.RawIOBase):
+    def __init__(self, kind):
+        self.kind = kind
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        frames.write(self.kind + struct.pack("<I", len(data)) + data)
+        return len(data)
+
+
+def text(kind):
+    return io.TextIOWrapper(FrameWriter(kind), "utf-8", "replace",
+                            write_through=True)
+
+
+path = sys.path[:]
+
+for line in sys.stdin:
+    request = json.loads(line)
+    sys.stdout, sys.stderr = text(b"o"), text(b"e")
+    sys.stdin = open(os.devnull)
+    sys.argv = request["argv"]
+    sys.path[:] = [os.path.dirname(request["script"])] + path[1:]
+    status = 0
+
+    try:
+        os.chdir(request["cwd"])
+        runpy.run_path(request["script"], run_name="__main__")
+    except SystemExit as error:
+        if error.code is None:
+            status = 0
+        elif isinstance(error.code, int):
+            status = error.code
+        else:
+            print(error.code, file=sys.stderr)
+            status = 1
+    except BaseException:
+        traceback.print_exc()
+        status = 1
+
+    for stream in (sys.stdout, sys.stderr, sys.stdin):
+        try:
+            stream.close()
+        except Exception:
+            pass
+
+    frames.write(b"x" + struct.pack("<I", 4) + struct.pack("<i", status))
+"""
+
+
+class Worker:
+    def __init__(self) -> None:
+        # stdin is the request pipe, the script gets devnull instead.
+        # ctrl + c at the prompt must not reach idle workers
+        self.proc = Popen([executable, "-c", WORKER], stdin=PIPE,
+                          stdout=PIPE, **DETACHED)
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def run(self, script: str, argv: list[str], out: TextIO,
+            err: TextIO) -> int | None:
+        """ Runs script and writes its output as it arrives. Returns its
+            exit status, or None if the worker died while running it. """
+
+        request = {"script": script, "argv": argv, "cwd": os.getcwd()}
+        self.proc.stdin.write(json.dumps(request).encode() + b"\n")
+        self.proc.stdin.flush()
+
+        decoders = {b"o": (out, codecs.getincrementaldecoder("utf-8")("replace")),
+                    b"e": (err, codecs.getincrementaldecoder("utf-8")("replace"))}
+        read = self.proc.stdout.read
+
+        while True:
+            header = read(5)
+
+            if len(header) < 5:
+                return None
+
+            kind = header[:1]
+            size, = struct.unpack("<I", header[1:])
+            data = read(size)  # buffered, short only at EOF
+
+            if len(data) < size:
+                return None
+
+            if kind == b"x":
+                return struct.unpack("<i", data)[0]
+
+            stream, decoder = decoders[kind]
+            stream.write(decoder.decode(data))
+            stream.flush()
+
+    def close(self) -> None:
+        self.proc.kill()
+        self.proc.wait()
+
+
+class WorkerPool:
+    """ Idle workers, started ahead of time so a run never waits for
+        one. A worker that dies or is interrupted is replaced. """
+
+    def __init__(self, size: int = WORKERS) -> None:
+        self.size = size
+        self.idle: list[Worker] = []
+
+    def start(self) -> None:
+        while len(self.idle) < self.size:
+            self.idle.append(Worker())
+
+    def run(self, script: str, argv: list[str], out: TextIO,
+            err: TextIO) -> int:
+        worker = None
+
+        while self.idle and worker is None:
+            worker = self.idle.pop()
+
+            if not worker.alive():
+                worker = None
+
+        if worker is None:
+            worker = Worker()
+
+        try:
+            status = worker.run(script, argv, out, err)
+        except BaseException:
+            worker.close()  # may be mid-frame, cannot be reused
+            self.start()
+            raise
+
+        if status is None:
+            worker.close()
+            status = 1
+        else:
+            self.idle.append(worker)
+
+        self.start()
+        return status
+
+    def close(self) -> None:
+        for worker in self.idle:
+            worker.close()
+
+        self.idle.clear()